@@ -0,0 +1,201 @@
+"""Benchmark of the stages of the check_time pipeline.
+
+It reuses the columns of the test data generators, converts them to the
+result sets that InfluxDB would return and feeds them directly to the
+pipeline, so no DB is needed. Above `BASELINE_LIMIT` points the stages
+that build a dict per point are skipped. Each measurement is printed as a json line:
+
+    {"stage": "normalize_data", "schema": "icinga", "value_type": "usage",
+     "size": 100000, "seconds": 0.041, "peak_memory": 4800512, ...}
+
+Run it from the root of the repository with:
+
+    python -m benchmarks.bench_check_time --sizes 1000,10000,100000,1000000,10000000
+"""
+import gc
+import sys
+import json
+import argparse
+import platform
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+from influxdb.resultset import ResultSet
+
+from influx_plugins.utils import DBAdapter, parse_time_to_epoch, parse_times_to_epoch
+from influx_plugins.utils.db_adapter import concatenate_columns, to_dataframe
+from influx_plugins.utils.influxql_backend import InfluxQLBackend, decode_series
+from influx_plugins.check_time.normalize_data import normalize_data, normalize_batches
+from influx_plugins.check_time.predict_time_left import predict_time_left
+from influx_plugins.check_time.estimators import ESTIMATORS
+from tests.test_utils import (
+    icinga_schema_check_time_columns,
+    icinga_schema_check_time_columns_free,
+    telegraf_schema_check_time_columns,
+    telegraf_schema_check_time_columns_no_max,
+)
+
+SCHEMAS = {
+    "icinga":icinga_schema_check_time_columns,
+    "icinga_free":icinga_schema_check_time_columns_free,
+    "telegraf":telegraf_schema_check_time_columns,
+    "telegraf_no_max":telegraf_schema_check_time_columns_no_max,
+}
+
+# Above this number of points the stages with a dict per point are skipped
+BASELINE_LIMIT = 1000000
+
+VALUE_TYPES = [
+    "usage", "usage_percentile", "usage_quantile",
+    "free", "free_percentile", "free_quantile"
+]
+
+class ReplayClient:
+    """Takes the place of the InfluxDBClient in the InfluxQL backend and answers
+    every query with the given raw result"""
+    def __init__(self, raw):
+        self.raw = raw
+
+    def query(self, query, *args, chunked=False, chunk_size=0, **kwargs):
+        if not chunked:
+            return ResultSet(self.raw)
+        return (
+            ResultSet({"series":[dict(series, values=series["values"][i:i + chunk_size])]})
+            for series in self.raw["series"]
+            for i in range(0, len(series["values"]), chunk_size)
+        )
+
+    def close(self):
+        pass
+
+def create_result(schema, size):
+    """Generate the columns and convert them to the raw result of the
+    check_time query, with the times as integer epochs"""
+    # Some generators add noise, keep it the same across runs
+    np.random.seed(0)
+    _, columns, _, _, settings = SCHEMAS[schema](size)
+    value_column = settings.get("target_column") or settings["value_column"]
+    max_column = settings.get("max_column")
+    names = ["time", "value"] + (["max"] if max_column else [])
+
+    rows = list(map(list, zip(*[
+        columns[name].tolist()
+        for name in ["time", value_column] + ([max_column] if max_column else [])
+    ])))
+    times = np.char.add(
+        np.datetime_as_string(columns["time"].astype("datetime64[s]"), unit="us"), "Z"
+    ).tolist()
+    settings["window"] = 10 * size
+    raw = {"series":[{"name":settings["measurement"], "columns":names, "values":rows}]}
+    return settings, raw, times
+
+def measure(function, *args):
+    """Return the result, the seconds and the peak of memory allocated
+    of the call, the time and the memory are measured in two different
+    calls since tracing the memory slows down the execution"""
+    gc.collect()
+    start = perf_counter()
+    result = function(*args)
+    seconds = perf_counter() - start
+    del result
+
+    gc.collect()
+    tracemalloc.start()
+    result = function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak
+
+def benchmark(schema, size):
+    """Yield a record for each stage of the pipeline"""
+    settings, raw, times = create_result(schema, size)
+
+    db = DBAdapter({"database":"benchmark", "host":"localhost", "port":8086}, settings["db_type"])
+    # A backend of its own, the one of the pool is shared by all the adapters
+    db.backend = InfluxQLBackend(db.settings, db.chunk_size)
+    db.backend.client = ReplayClient(raw)
+
+    baselines = size <= BASELINE_LIMIT
+
+    if baselines:
+        yield "parse_time_to_epoch", None, measure(lambda: [parse_time_to_epoch(t) for t in times])
+    yield "parse_times_to_epoch", None, measure(parse_times_to_epoch, times)
+
+    # The decoding of the response, with a dict per point and by columns
+    if baselines:
+        result = ResultSet(raw)
+        yield "decode[get_points]", None, measure(lambda: list(result.get_points()))
+    yield "decode[columns]", None, measure(lambda: [decode_series(series) for series in raw["series"]])
+    columns = concatenate_columns((None, decode_series(series)) for series in raw["series"])
+    yield "to_dataframe", None, measure(to_dataframe, columns)
+
+    batches, seconds, peak = measure(lambda: list(db.get_check_time_data(settings)))
+    yield "get_check_time_data", None, (batches, seconds, peak)
+    if baselines:
+        points = [
+            dict(zip(series["columns"], row))
+            for series in raw["series"]
+            for row in series["values"]
+        ]
+
+    for value_type in VALUE_TYPES:
+        if baselines:
+            yield "normalize_data", value_type, measure(normalize_data, points, value_type, 100)
+        yield "normalize_batches", value_type, measure(normalize_batches, batches, value_type, 100)
+
+    (_, x, y), = normalize_batches(batches, "usage", 100)
+    x = x - x.min()
+
+    for estimator in ESTIMATORS:
+        yield "predict_time_left[{}]".format(estimator), None, measure(predict_time_left, x, y, None, estimator)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the check_time pipeline")
+    parser.add_argument(
+        "--sizes",
+        help="Comma separated number of points to benchmark",
+        type=str,
+        default="1000,10000,100000,1000000,10000000",
+    )
+    parser.add_argument(
+        "--schemas",
+        help="Comma separated schemas to benchmark",
+        type=str,
+        default=",".join(SCHEMAS),
+    )
+    parser.add_argument(
+        "--output",
+        help="Where to write the json lines, by default stdout",
+        type=str,
+        default=None,
+    )
+    args = parser.parse_args()
+
+    # The pipeline logs at each stage
+    from influx_plugins.utils import setLevel
+    import logging
+    setLevel(logging.CRITICAL)
+
+    environment = {
+        "python":platform.python_version(),
+        "numpy":np.__version__,
+    }
+
+    output = sys.stdout if args.output is None else open(args.output, "w")
+    for schema in args.schemas.split(","):
+        for size in [int(size) for size in args.sizes.split(",")]:
+            for stage, value_type, (_, seconds, peak) in benchmark(schema, size):
+                output.write(json.dumps({
+                    "stage":stage,
+                    "schema":schema,
+                    "value_type":value_type,
+                    "size":size,
+                    "seconds":seconds,
+                    "peak_memory":peak,
+                    **environment,
+                }) + "\n")
+                output.flush()
+
+if __name__ == "__main__":
+    main()
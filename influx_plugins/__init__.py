@@ -1,3 +1,4 @@
-from .check_time import check_time_cli, check_time
+from .check_time import check_time_cli, check_time, check_time_batch
+from .check_time import check_time_client, check_time_service
 from .anomaly_detection import anomaly_detection_cli, anomaly_detection
 from . import check_time as ct
\ No newline at end of file
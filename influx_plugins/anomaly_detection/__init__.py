@@ -1,2 +1,8 @@
 from .anomaly_detection_cli import anomaly_detection_cli
-from .anomaly_detection_main import anomaly_detection
\ No newline at end of file
+
+# This is a wrapper so that importing the package does not import pandas
+# and the influxdb client, which are loaded only when needed.
+
+def anomaly_detection(settings):
+    from .anomaly_detection_main import anomaly_detection
+    return anomaly_detection(settings)
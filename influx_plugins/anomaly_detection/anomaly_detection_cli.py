@@ -2,10 +2,7 @@ import os
 import sys
 import logging
 import argparse
-import urllib3
-urllib3.disable_warnings()
 
-from .anomaly_detection_main import anomaly_detection
 from ..utils import (
     copyrights, Colors, logger, epoch_to_time, 
     time_to_epoch, MyParser,
@@ -69,6 +66,13 @@ Example:
     ) 
     
     
+    read_settings.add_argument(
+        "--concurrency",
+        help="How many queries of the selector groups can run at the same time.%s"%default_fmt,
+        type=int,
+        default=8,
+    )
+
     analysis_settings = parser.add_argument_group('{cyan}Analysis settings{reset}'.format(cyan=Colors.CYAN, reset=Colors.RESET))
     analysis_settings.add_argument(
         "--window",
@@ -108,6 +112,21 @@ will be classified as anomalies.
         type=float,
         default=0.99,
     ) 
+    analysis_settings.add_argument(
+        "--model-dir",
+        help=
+"""Directory where to keep the trained thresholds of the selector groups between runs.
+If passed, each run trains only the new groups and the ones trained more than 
+--model-ttl ago, the others are classified with the stored thresholds.""",
+        type=str,
+        default=None,
+    )
+    analysis_settings.add_argument(
+        "--model-ttl",
+        help="How long the stored thresholds of a group are used before training it again.%s"%default_fmt,
+        type=str,
+        default="1d",
+    )
     
     write_settings = parser.add_argument_group('{cyan}Write settings{reset}'.format(cyan=Colors.CYAN, reset=Colors.RESET))
     write_settings.add_argument(
@@ -124,6 +143,30 @@ on a file with format `{output_database}.{output_measurement}.{selectors}.json`"
         action="store_true",
         default=False,
     ) 
+    write_settings.add_argument(
+        "--write-batch-size",
+        help="How many points are sent to the db in each write request.%s"%default_fmt,
+        type=int,
+        default=5000,
+    )
+    write_settings.add_argument(
+        "--write-queue-size",
+        help=
+"""How many batches can wait to be written while the next groups are analyzed,
+when the queue is full the analysis waits for the writes.%s"""%default_fmt,
+        type=int,
+        default=8,
+    )
+
+    write_settings.add_argument(
+        "--telemetry-measurement",
+        help=
+"""If passed, at the end of the run the durations of the queries, of the training,
+of the classification and of the writes are written to this measurement of the
+output database.""",
+        type=str,
+        default=None,
+    )
 
     db_settings = parser.add_argument_group(
 """{cyan}Database settings (optional){reset}
@@ -164,6 +207,39 @@ The settings for the DB will follow the following priorities:
         type=str, 
         default=None,
     ) 
+    db_settings.add_argument(
+        "--backend",
+        help="Use `influxql` for InfluxDB 1.x or `flux` for InfluxDB 2.x. (default \"influxql\")",
+        type=str,
+        choices=["influxql", "flux"],
+        default=None,
+    )
+    db_settings.add_argument(
+        "--org",
+        help="The organization of the buckets, only for the flux backend.",
+        type=str,
+        default=None,
+    )
+    db_settings.add_argument(
+        "--token",
+        help="The token to use to login, only for the flux backend. (default \"username:password\")",
+        type=str,
+        default=None,
+    )
+    db_settings.add_argument(
+        "--record-dir",
+        help="Directory where to save the result of each query, to replay it later with --replay-dir.",
+        type=str,
+        default=None,
+    )
+    db_settings.add_argument(
+        "--replay-dir",
+        help=
+"""Read the results of the queries recorded with --record-dir from this directory
+instead of the db, the writes are discarded.""",
+        type=str,
+        default=None,
+    )
     db_settings.add_argument(
         "--host",
         help="The hostname / ip of the Influx DBMS. (default \"localhost\")",
@@ -209,6 +285,33 @@ and the certificate, or as a tuple of both files paths. %s"""%default_fmt,
         type=str,
         default=None,
     )
+    db_settings.add_argument(
+        "--use-udp",
+        help=
+"""Write the results over UDP without waiting for the acknowledgement of the DB.
+The UDP listener of InfluxDB must be enabled on the output database with the
+default (nanoseconds) precision.""",
+        action="store_true",
+        default=None,
+    )
+    db_settings.add_argument(
+        "--udp-port",
+        help="The port of the UDP listener of the Influx DBMS. (default 4444)",
+        type=int,
+        default=None,
+    )
+    db_settings.add_argument(
+        "--udp-mtu",
+        help="The maximum size in bytes of each UDP datagram. (default 1400)",
+        type=int,
+        default=None,
+    )
+    db_settings.add_argument(
+        "--udp-rate",
+        help="The maximum number of UDP datagrams sent per second. (default 10000)",
+        type=int,
+        default=None,
+    )
 
     args = vars(parser.parse_args())
 
@@ -226,6 +329,7 @@ and the certificate, or as a tuple of both files paths. %s"""%default_fmt,
         "input_measurement": "measurement",
         "output_database": "icinga2_ml",
         "output_measurement": "measurement",
+        "backend": "influxql",
         "host": "localhost",
         "port": 8086,
         "username": "root",
@@ -236,6 +340,8 @@ and the certificate, or as a tuple of both files paths. %s"""%default_fmt,
         "retries": 3,
         "use_udp": False,
         "udp_port": 4444,
+        "udp_mtu": 1400,
+        "udp_rate": 10000,
         "proxies": {},
         "cert": None
     }
@@ -250,4 +356,7 @@ and the certificate, or as a tuple of both files paths. %s"""%default_fmt,
         if v is not None
     })
 
+    # The import is here so that the arguments are parsed before loading
+    # the heavy dependencies
+    from .anomaly_detection_main import anomaly_detection
     anomaly_detection(db_defaults)
@@ -1,41 +1,37 @@
 import json
+import asyncio
 import logging
-import pandas as pd
-from influxdb import InfluxDBClient
-from ..utils import logger, setLevel, DBAdapter
+from ..utils import logger, setLevel, DBAdapter, AsyncDBAdapter, BatchWriter
+from ..utils import telemetry, format_group, columns_to_lines
 from ..utils import parse_time_to_epoch
+from ..utils.db_adapter import time_slots
+from .model_store import stored_models
 
 
 
-def classify_point(point, training_data):
-    ts = pd.Timestamp(point["time"])
-    key = (ts.day_name(), ts.hour)
-    warn_threshold = training_data[key]["warning"]
-    anom_threshold = training_data[key]["anomaly"]
-    if point["value"] > anom_threshold:
-        return {
-            "warning":0,
-            "anomaly":1,
-            "value":point["value"],
-            "warn_threshould":warn_threshold,
-            "anom_threshold":anom_threshold,
-        }
-    elif anom_threshold > point["value"] > warn_threshold:
-        return {
-            "warning":1,
-            "anomaly":0,
-            "value":point["value"],
-            "warn_threshould":warn_threshold,
-            "anom_threshold":anom_threshold,
-        }
-    else:
-        return {
-            "warning":0,
-            "anomaly":0,
-            "value":point["value"],
-            "warn_threshould":warn_threshold,
-            "anom_threshold":anom_threshold,
-        }
+def classify(columns, thresholds):
+    """Classify the `time` and `value` columns with the `(7, 24, 2)`
+    thresholds of the hour of the week of each point.
+    It returns the `time` column and a column for each field of the output
+    points, the points in the hours without thresholds are dropped."""
+    import numpy as np
+    warning_thresholds, anomaly_thresholds = thresholds.reshape(-1, 2)[
+        time_slots(columns["time"])
+    ].T
+    known = ~np.isnan(anomaly_thresholds)
+    values = columns["value"][known]
+    warning_thresholds = warning_thresholds[known]
+    anomaly_thresholds = anomaly_thresholds[known]
+    anomaly = values > anomaly_thresholds
+    warning = (anomaly_thresholds > values) & (values > warning_thresholds)
+    return {
+        "time":columns["time"][known],
+        "warning":warning.astype(np.int64),
+        "anomaly":anomaly.astype(np.int64),
+        "value":values,
+        "warn_threshould":warning_thresholds,
+        "anom_threshold":anomaly_thresholds,
+    }
 
 def anomaly_detection(settings):
     # Set the logger level
@@ -46,9 +42,22 @@ def anomaly_detection(settings):
         "critical":logging.CRITICAL,
     }[settings["verbosity"]])
 
+    telemetry.enable(settings.get("telemetry_measurement") is not None)
+
     input_db_settings = {
         key:settings[key]
         for key in [
+            "backend",
+            "org",
+            "token",
+            "url",
+            "chunk_size",
+            "record_dir",
+            "replay_dir",
+            "use_udp",
+            "udp_port",
+            "udp_mtu",
+            "udp_rate",
             "host",
             "port",
             "username",
@@ -63,57 +72,113 @@ def anomaly_detection(settings):
     output_db_settings = input_db_settings.copy()
     output_db_settings["database"] = settings["output_database"]
 
-    in_db = DBAdapter(input_db_settings, None)
+    # Both share the pooled connections, so each connection is opened once
+    # for the whole run
+    in_db = AsyncDBAdapter(input_db_settings, None, settings.get("concurrency", 8))
+    out_db = DBAdapter(output_db_settings, None)
 
-    selectors_groups = in_db.get_selectors_combinations(settings)
+    # The results are written from a background thread, so the next groups
+    # are analyzed while the previous ones are being sent
+    writer = BatchWriter(
+        out_db,
+        settings.get("write_batch_size", 5000),
+        settings.get("write_queue_size", 8),
+        protocol="line",
+    )
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(analyze_groups(in_db, writer, settings))
+    finally:
+        loop.close()
+        in_db.close()
+        write_stats = writer.close()
+
+    if settings.get("telemetry_measurement") is not None and not settings["dry_run"]:
+        telemetry.write(out_db, settings["telemetry_measurement"], "anomaly_detection")
+
+    # The writer only logs the failed batches, so that the others are still
+    # sent, but the run must fail
+    if write_stats["failed_batches"] != 0:
+        raise RuntimeError("Failed to write {failed_points} points in {failed_batches} batches".format(**write_stats))
+
+async def analyze_groups(in_db, writer, settings):
+    """Fetch the data of the selector groups concurrently and classify each
+    group as soon as its data arrives.
+    The training data of all the groups is read with a single query, while
+    the data to classify is read for each group. With `model_dir` only the
+    new groups and the ones whose thresholds are older than `model_ttl` are
+    trained."""
+    selectors_groups = await in_db.get_selectors_combinations(settings)
 
     logger.info("There are %s unique combinations of selectors.", len(selectors_groups))
 
-    for selector_values in selectors_groups:
+    if settings.get("model_dir") is None:
+        training = asyncio.ensure_future(in_db.get_all_training_data(selectors_groups, settings))
+    else:
+        training = asyncio.ensure_future(stored_models(in_db, selectors_groups, settings))
+
+    async def analyze_group(i, selector_values):
         logger.info("Analyzing the selector group: %s", selector_values)
-        training_data = in_db.get_training_data(selector_values, settings)
-        logger.info("Computed training data:\n%s", training_data)
-        data_generator = in_db.get_anomaly_data(selector_values, settings)
-        
-        logger.info("Classifying the data")
-        classifications = [
-            {
-                "measurement": settings["output_measurement"],
-                "time":point["time"],
-                "fields":classify_point(point, training_data),
-                "tags":selector_values,
-            }
-            for point in data_generator
-        ]
-        
-        
-        if len(classifications) == 0:
-            logger.info("There is no data to classify for the current selectors values and the current filter")
-            continue
-
-        logger.info("An example of the classified data is:\n%s", classifications[0])
-
-        if settings["dry_run"]:
-            logger.info("Dry-run enabled, gonna skip to the next task and not write any data.")
-            continue
-
-        if settings["write_to_file"]:
-            file_path = "debug/{output_database}.{output_measurement}.{selectors_str}.json".format(
-                selectors_str="_".join("{}_{}".format(k,v) for k,v in selector_values.items()),
-                **settings,
-            )
-            logger.info("the flag `write_to_file` is setted, dumping the data to '%s'", file_path)
-            with open(file_path, "w") as f:
-                json.dump(classifications, f)
-
-            continue
-
-        logger.info("Writing the classified data to the db `%s`", output_db_settings["database"])
-        # Write to db
-        client = InfluxDBClient(**output_db_settings)
-        # ensure that the database exists
-        client.create_database(output_db_settings["database"])
-        client.switch_database(output_db_settings["database"])
-        # Write the data
-        client.write_points(classifications)
-        logger.info("Success, wrote the data to the db `%s`", output_db_settings["database"])
\ No newline at end of file
+        columns = await in_db.get_anomaly_data(selector_values, settings)
+        training_data = (await training)[i]
+        logger.info("Computed training data for %s:\n%s", selector_values, training_data)
+        write_classifications(selector_values, training_data, columns, writer, settings)
+
+    await asyncio.gather(training, *[
+        analyze_group(i, selector_values)
+        for i, selector_values in enumerate(selectors_groups)
+    ])
+
+def write_classifications(selector_values, training_data, columns, writer, settings):
+    """Classify the `time` and `value` columns of a selector group and send
+    the results to the writer"""
+    logger.info("Classifying the data")
+    group = format_group(selector_values)
+    with telemetry.measure("classification", group, points=len(columns["time"])):
+        fields = classify(columns, training_data)
+
+    points = len(fields["time"])
+    skipped = len(columns["time"]) - points
+    if skipped != 0:
+        logger.warning("%s points of %s have no training data for their hour of the week and are skipped", skipped, selector_values)
+
+    if points == 0:
+        logger.info("There is no data to classify for the current selectors values and the current filter")
+        return
+
+    logger.info("An example of the classified data is:\n%s", classification_points(selector_values, fields, settings, 1)[0])
+
+    if settings["dry_run"]:
+        logger.info("Dry-run enabled, gonna skip to the next task and not write any data.")
+        return
+
+    if settings["write_to_file"]:
+        file_path = "debug/{output_database}.{output_measurement}.{selectors_str}.json".format(
+            selectors_str="_".join("{}_{}".format(k,v) for k,v in selector_values.items()),
+            **settings,
+        )
+        logger.info("the flag `write_to_file` is setted, dumping the data to '%s'", file_path)
+        with open(file_path, "w") as f:
+            json.dump(classification_points(selector_values, fields, settings), f)
+        return
+
+    logger.info("Queueing the classified data for the db `%s`", settings["output_database"])
+    # The time to format the lines and to wait for the writer, when the db
+    # is slower than the analysis
+    with telemetry.measure("write_queue", group, points=points):
+        writer.write(columns_to_lines(settings["output_measurement"], selector_values, fields))
+
+def classification_points(selector_values, fields, settings, limit=None):
+    """Build the classified points in the json format of the InfluxDBClient,
+    only to show or to dump them, the writer gets the lines straight from
+    the columns"""
+    names = [name for name in fields if name != "time"]
+    return [
+        {
+            "measurement": settings["output_measurement"],
+            "time":time,
+            "fields":dict(zip(names, row)),
+            "tags":selector_values,
+        }
+        for time, *row in zip(*[fields[name][:limit].tolist() for name in ["time"] + names])
+    ]
@@ -0,0 +1,137 @@
+import os
+import fcntl
+import asyncio
+from time import time
+import numpy as np
+from ..utils import logger, settings_key, atomic_write, read_json, write_json
+from ..utils import format_group, time_to_epoch
+
+# The settings that change the trained thresholds
+MODEL_KEYS = [
+    "backend",
+    "url",
+    "org",
+    "host",
+    "port",
+    "input_database",
+    "input_measurement",
+    "field",
+    "selectors",
+    "filter",
+    "training_timeframe",
+    "warning",
+    "anomaly",
+]
+
+# The shape of the thresholds of a group, see `compute_thresholds`
+MODEL_SHAPE = (7, 24, 2)
+MODEL_SIZE = 7 * 24 * 2 * 8
+
+# The groups not trained for this many ttls are dropped from the store
+EXPIRE_TTLS = 3
+
+class ModelStore:
+    """The trained thresholds of the selector groups of an analysis.
+
+    The thresholds of all the groups are a single raw float64 array of shape
+    `(groups, 7, 24, 2)` which is memory-mapped on load. The metadata, with
+    the `groups` (formatted with `format_group`) in the order of the array
+    and when each of them was trained, is in a json next to it and a lock
+    file serializes the processes updating the same analysis.
+    """
+
+    def __init__(self, directory, key):
+        os.makedirs(directory, exist_ok=True)
+        self.prefix = os.path.join(directory, "{}.models".format(key))
+        self.key = key
+
+    def path(self, extension):
+        return "{}.{}".format(self.prefix, extension)
+
+    def load_meta(self):
+        meta = read_json(self.path("json"))
+        if meta is None or meta.get("key") != self.key or (
+            not os.path.exists(self.path("thresholds"))
+            or os.path.getsize(self.path("thresholds")) < len(meta["groups"]) * MODEL_SIZE
+        ):
+            return {"key":self.key, "groups":[], "trained_at":[]}
+        return meta
+
+    def read(self, meta):
+        """Memory-map the thresholds of the groups in the metadata"""
+        if len(meta["groups"]) == 0:
+            return np.empty((0,) + MODEL_SHAPE)
+        return np.memmap(
+            self.path("thresholds"), dtype=np.float64, mode="r",
+            shape=(len(meta["groups"]),) + MODEL_SHAPE,
+        )
+
+    def update(self, meta, groups, thresholds, trained_at, expire_before=None):
+        """Store the thresholds of the groups, replacing the old ones of the
+        groups already in the store. The other groups trained before
+        `expire_before` are dropped, as they are not analyzed anymore."""
+        models = np.array(self.read(meta))
+        if expire_before is not None:
+            updated = set(groups)
+            keep = [
+                i
+                for i, (group, trained) in enumerate(zip(meta["groups"], meta["trained_at"]))
+                if trained >= expire_before or group in updated
+            ]
+            if len(keep) != len(meta["groups"]):
+                logger.info("Dropping %s expired selector groups", len(meta["groups"]) - len(keep))
+            models = models[keep]
+            meta["groups"] = [meta["groups"][i] for i in keep]
+            meta["trained_at"] = [meta["trained_at"][i] for i in keep]
+        index = {group:i for i, group in enumerate(meta["groups"])}
+        new = [group for group in groups if group not in index]
+        for group in new:
+            index[group] = len(meta["groups"])
+            meta["groups"].append(group)
+            meta["trained_at"].append(trained_at)
+        models = np.concatenate([models, np.full((len(new),) + MODEL_SHAPE, np.nan)])
+
+        rows = [index[group] for group in groups]
+        models[rows] = thresholds
+        for i in rows:
+            meta["trained_at"][i] = trained_at
+
+        atomic_write(self.path("thresholds"), np.ascontiguousarray(models, dtype=np.float64).tobytes())
+        write_json(self.path("json"), meta)
+
+async def stored_models(in_db, selectors_groups, settings):
+    """Return the `(groups, 7, 24, 2)` thresholds of the selector groups,
+    training only the groups which are new or were trained more than
+    `model_ttl` ago and keeping the thresholds in `settings["model_dir"]`.
+
+    If all the groups have to be trained they are read with a single query,
+    otherwise each of them is read with its own query."""
+    store = ModelStore(settings["model_dir"], settings_key(settings, MODEL_KEYS))
+    ttl = time_to_epoch(settings.get("model_ttl", "1d"))
+    now = int(time())
+    groups = [format_group(selector_values) for selector_values in selectors_groups]
+
+    with open(store.path("lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        meta = store.load_meta()
+        trained_at = dict(zip(meta["groups"], meta["trained_at"]))
+        stale = [
+            i
+            for i, group in enumerate(groups)
+            if trained_at.get(group, -ttl) + ttl <= now
+        ]
+        logger.info("Training %s of the %s selector groups", len(stale), len(groups))
+
+        if len(stale) != 0:
+            if len(stale) == len(groups):
+                thresholds = await in_db.get_all_training_data(selectors_groups, settings)
+            else:
+                thresholds = np.stack(await asyncio.gather(*[
+                    in_db.get_training_data(selectors_groups[i], settings)
+                    for i in stale
+                ]))
+            store.update(meta, [groups[i] for i in stale], thresholds, now, now - EXPIRE_TTLS * ttl)
+
+        index = {group:i for i, group in enumerate(meta["groups"])}
+        return store.read(meta)[[index[group] for group in groups]]
@@ -1,2 +1,17 @@
 from .check_time_cli import check_time_cli
-from .check_time_main import check_time
\ No newline at end of file
+from .check_time_client import check_time_client
+
+# These are wrappers so that importing the package does not import numpy,
+# sklearn and the influxdb client, which are loaded only when needed.
+
+def check_time(settings):
+    from .check_time_main import check_time
+    return check_time(settings)
+
+def check_time_batch(settings):
+    from .check_time_main import check_time_batch
+    return check_time_batch(settings)
+
+def check_time_service(argv=None):
+    from .check_time_service import check_time_service
+    return check_time_service(argv)
@@ -2,10 +2,7 @@ import os
 import sys
 import logging
 import argparse
-import urllib3
-urllib3.disable_warnings()
 
-from .check_time_main import check_time
 from ..utils import (
     copyrights, Colors, logger, epoch_to_time, 
     MyParser 
@@ -59,8 +56,9 @@ time       host        service    disk_utilization disk_utilization_max
     reset=Colors.RESET,
 )
 
-def check_time_cli():
-    """The Cli adapter for the check_time utility."""
+def check_time_cli(argv=None):
+    """The Cli adapter for the check_time utility.
+    `argv` defaults to the arguments of the process."""
     parser = MyParser(
         description=description, 
         formatter_class=argparse.RawTextHelpFormatter
@@ -87,6 +85,15 @@ def check_time_cli():
         default=None,
     )
 
+    parser.add_argument(
+        "--telemetry-measurement", 
+        help=
+"""If passed, at the end of the check the durations of the queries and of the
+fit are written to this measurement of the db.""",         
+        type=str, 
+        default=None,
+    )
+
     thresholds_settings = parser.add_argument_group(
 """{cyan}thresholds settings (required){reset}
 (these 3 arguments take values in the influx time format. E.g 1w2d3h4m5.6s is 1 week + 2 day + 3 hours + 4 minutes + 5.6 seconds)""".format(cyan=Colors.CYAN, reset=Colors.RESET))
@@ -176,6 +183,29 @@ Example:
         default="",
     )
 
+    query_settings.add_argument(
+        "--estimator", 
+        help=
+"""The regressor used to fit the line:
+- `bayesian_ridge`: sklearn BayesianRidge
+- `ols`:            ordinary least squares, numpy only
+- `huber`:          robust to spikes and drops (e.g. cleanups and log rotations)
+- `theil_sen`:      robust, median of the slopes of (at most 10000) random pairs of points
+%s"""%default_fmt,         
+        type=str, 
+        choices=["bayesian_ridge", "ols", "huber", "theil_sen"],
+        default="bayesian_ridge",
+    )
+    query_settings.add_argument(
+        "--max-points", 
+        help=
+"""If passed, the data is averaged server side with `MEAN(...) GROUP BY time(<bucket>)`
+where the bucket is chosen so that at most this many points are read.
+This bounds the data transferred and the fit time for long windows.""",         
+        type=int, 
+        default=None,
+    )
+
     icinga_settings = parser.add_argument_group('{blue}icinga db settings (required if --db-type=icinga){reset}'.format(blue=Colors.BLUE, reset=Colors.RESET))
     icinga_settings.add_argument(
         "--target-column", 
@@ -204,7 +234,83 @@ Example:
         default="value",
     )
 
-    args = vars(parser.parse_args())
+    batch_settings = parser.add_argument_group('{cyan}batch settings (optional){reset}'.format(cyan=Colors.CYAN, reset=Colors.RESET))
+    batch_settings.add_argument(
+        "--group-by", 
+        help=
+"""The tags, separated by commas (no spaces), used to split the data in series.
+All the series are read with a single query and a status line is printed for
+each one of them, the exit code is the worst one.
+Example:
+--group-by="host,service,disk" """,         
+        type=str, 
+        default=None,
+    )
+
+    incremental_settings = parser.add_argument_group('{cyan}incremental settings (optional){reset}'.format(cyan=Colors.CYAN, reset=Colors.RESET))
+    incremental_settings.add_argument(
+        "--state-dir", 
+        help=
+"""Directory where to keep the regression statistics of each check between runs.
+If passed, each run reads only the points that entered or left the window since 
+the previous run and the prediction is done with an ordinary least squares fit.""",         
+        type=str, 
+        default=None,
+    )
+    incremental_settings.add_argument(
+        "--series-cache-dir", 
+        help=
+"""Directory where to keep a local copy of the series of each check between runs.
+If passed, each run reads only the points newer than the last run and drops 
+from the copy the ones older than the window, any --estimator can be used.""",         
+        type=str, 
+        default=None,
+    )
+
+    cache_settings = parser.add_argument_group('{cyan}cache settings (optional){reset}'.format(cyan=Colors.CYAN, reset=Colors.RESET))
+    cache_settings.add_argument(
+        "--cache-dir", 
+        help=
+"""Directory where to cache the predictions, if passed the same check executed 
+again within --cache-ttl returns the cached result without querying the db.""",         
+        type=str, 
+        default=None,
+    )
+    cache_settings.add_argument(
+        "--cache-ttl", 
+        help="For how long a cached prediction is valid, in the influx time format.%s"%default_fmt,         
+        type=str, 
+        default="60s",
+    )
+    cache_settings.add_argument(
+        "--cache-size", 
+        help="The maximum number of predictions to keep in the cache, the oldest are removed first.%s"%default_fmt,         
+        type=int, 
+        default=1000,
+    )
+
+    replay_settings = parser.add_argument_group('{cyan}record / replay settings (optional){reset}'.format(cyan=Colors.CYAN, reset=Colors.RESET))
+    replay_settings.add_argument(
+        "--record-dir", 
+        help="Directory where to save the result of each query, to replay it later with --replay-dir.",         
+        type=str, 
+        default=None,
+    )
+    replay_settings.add_argument(
+        "--replay-dir", 
+        help="Read the results of the queries recorded with --record-dir from this directory instead of the db.",         
+        type=str, 
+        default=None,
+    )
+
+    args = vars(parser.parse_args(argv))
+
+    if args["group_by"] is not None:
+        sys.exit(check_time_batch_cli(args))
+
+    # The import is here so that the arguments are parsed before loading
+    # the heavy dependencies
+    from .check_time_main import check_time
 
     # Run the prediction
     time_predicted, score = check_time(args)
@@ -212,23 +318,51 @@ Example:
     logger.info("Warning threshold %s", args["warning_threshold"])
     logger.info("Critical threshold %s", args["critical_threshold"])
 
+    exit_code, status = get_status(time_predicted, args)
+
+    # Print the data in a format that is neteye compatible
+    # This should be the only thing in stdout
+    print("{}: {} {} ({:.2f}%)".format(status, time_predicted, epoch_to_time(time_predicted), 100 * score))
+    # Flush now as the debug plot could still be rendering in background
+    sys.stdout.flush()
+    sys.exit(exit_code)
+
+def check_time_batch_cli(args):
+    """Print a status line for each series and return the worst exit code"""
+    from .check_time_main import check_time_batch
+    predictions = check_time_batch(args)
+
+    if len(predictions) == 0:
+        print("UNKNOWN: no series found")
+        return 3
+
+    exit_codes = []
+    for tags, time_predicted, score in predictions:
+        exit_code, status = get_status(time_predicted, args)
+        exit_codes.append(exit_code)
+        print("{}: {} {} {} ({:.2f}%)".format(
+            status, 
+            ",".join("{}={}".format(k, v) for k, v in tags.items()),
+            time_predicted, 
+            epoch_to_time(time_predicted), 
+            100 * score,
+        ))
+    sys.stdout.flush()
+
+    return max(exit_codes)
+
+def get_status(time_predicted, args):
+    """Compare the predicted time with the thresholds and return the exit code
+    and the status"""
     # Critical case
     if time_predicted <= args["critical_threshold"]:
         logger.critical("Critical threshold failed!")
-        exit_code = 2
-        status = "CRITICAL"
+        return 2, "CRITICAL"
     # Warning case
     elif time_predicted <= args["warning_threshold"]:
         logger.warning("Warning threshold failed!")
-        exit_code = 1
-        status = "WARNING"
+        return 1, "WARNING"
     # Ok case
     else:
         logger.info("Sucessfull exit")
-        exit_code = 0
-        status = "OK"
-
-    # Print the data in a format that is neteye compatible
-    # This should be the only thing in stdout
-    print("{}: {} {} ({:.2f}%)".format(status, time_predicted, epoch_to_time(time_predicted), 100 * score))
-    sys.exit(exit_code)
+        return 0, "OK"
@@ -1,11 +1,17 @@
 import os
 import json
 import logging
-from ..utils import logger, setLevel, DBAdapter, time_to_epoch, read_json_with_comments
-from .predict_time_left import predict_time_left
-from .normalize_data import normalize_data
+from ..utils import logger, setLevel, DBAdapter, time_to_epoch, read_json_with_comments, telemetry
+from .predict_time_left import predict_time_left, fit_time_left
+from .debug_plot import save_report, render_async
+from .normalize_data import normalize_batches
+from .regression_state import incremental_time_left
+from .result_cache import ResultCache
+from .series_cache import cached_series
 
-def check_time(settings):
+def prepare_check_time(settings):
+    """Validate the settings, convert the times to seconds (in place) and
+    return the DBAdapter to use for the check."""
     # Set the logger level
     setLevel({
         "debug":logging.DEBUG,
@@ -16,6 +22,8 @@ def check_time(settings):
 
     logger.info("Starting with settings %s", settings)
 
+    telemetry.enable(settings.get("telemetry_measurement") is not None)
+
     # Check that the arguments are coherent
     if settings["db_type"] == "icinga":
         if settings.get("target_column") is None:
@@ -50,18 +58,110 @@ def check_time(settings):
     db_settings = read_json_with_comments(settings["db_settings"])
     
     db_settings = db_settings.get("check_time", {})
+    for key in ["record_dir", "replay_dir"]:
+        if settings.get(key) is not None:
+            db_settings[key] = settings[key]
+
+    # The connections are pooled, so in the service the checks with the
+    # same db settings reuse the same client
+    return DBAdapter(db_settings, settings["db_type"])
 
-    db = DBAdapter(db_settings, settings["db_type"])
+def check_time(settings):
+    db = prepare_check_time(settings)
+
+    if settings.get("cache_dir") is None:
+        result = compute_time_left(db, settings)
+    else:
+        cache = ResultCache(
+            settings["cache_dir"], 
+            time_to_epoch(settings.get("cache_ttl") or "60s"), 
+            settings.get("cache_size") or 1000,
+        )
+        result = cache.get(settings)
+        if result is None:
+            result = compute_time_left(db, settings)
+            cache.put(settings, *result)
+
+    write_telemetry(db, settings)
+    return result
+
+def write_telemetry(db, settings):
+    """Write the telemetry of the run, if enabled"""
+    if settings.get("telemetry_measurement") is not None:
+        telemetry.write(db, settings["telemetry_measurement"], "check_time")
+
+def compute_time_left(db, settings):
+    """Read the data and return the predicted time left and the score"""
+    if settings.get("state_dir") is not None:
+        if settings.get("debug_plot") is not None:
+            logger.warning("--debug-plot is not supported with --state-dir, ignoring it")
+        return incremental_time_left(db, settings)
+
+    if settings.get("series_cache_dir") is not None:
+        x, y = cached_series(db, settings)
+        logger.info("Got %s points", x.size)
+        if x.size == 0:
+            logger.error("Got no point!")
+            raise ValueError("The query returned no point")
+        return predict_time_left(x - x.min(), y, settings.get("debug_plot"), settings.get("estimator", "bayesian_ridge"))
 
     logger.info("Retrieving the data from the db")
-    data = db.get_check_time_data(settings).get_points()
+    series = normalize_batches(
+        db.get_check_time_data(settings), 
+        settings["value_type"], 
+        settings.get("max_value"),
+    )
     logger.debug(settings)
-    x, y = normalize_data(data, settings["value_type"], settings.get("max_value"))   
+
+    if len(series) == 0:
+        logger.error("Got no point!")
+        raise ValueError("The query returned no point")
+
+    _, x, y = series[0]
+    # normalize data by removing the minimum to get better numerical stability
+    # this doesn't change the predicted values
+    x = x - x.min()
 
     logger.info("Got %s points", x.size)
 
-    if x.size == 0:
-        logger.error("Got no point!")
+    return predict_time_left(x, y, settings.get("debug_plot"), settings.get("estimator", "bayesian_ridge"))
+
+def check_time_batch(settings):
+    """Run the prediction for every series obtained grouping the data by the
+    comma separated tags in `settings["group_by"]`, all the series are read
+    with a single query.
+
+    It returns a list of `(tags, time_left, score)`.
+    If `debug_plot` is set, a single image with all the series is rendered
+    in background."""
+    db = prepare_check_time(settings)
+
+    if settings.get("state_dir") is not None:
+        logger.warning("--state-dir is not supported with --group-by, ignoring it")
+
+    logger.info("Retrieving the data from the db")
+    series = normalize_batches(
+        db.get_check_time_data(settings, group_by=settings["group_by"].split(",")), 
+        settings["value_type"], 
+        settings.get("max_value"),
+    )
+
+    predictions = []
+    report = []
+    for tags, x, y in series:
+        logger.info("Analyzing the series: %s", tags)
+        x = x - x.min()
+        logger.info("Got %s points", x.size)
+        prediction = fit_time_left(x, y, settings.get("estimator", "bayesian_ridge"))
+        predictions.append((tags, prediction.time_left, prediction.score))
+        if settings.get("debug_plot") is not None:
+            report.append((",".join("{}={}".format(k, v) for k, v in tags.items()), x, y, prediction))
+
+    if len(predictions) == 0:
+        logger.error("Got no series!")
+
+    if len(report) != 0:
+        render_async(save_report, settings["debug_plot"], report)
 
-    return predict_time_left(x, y, settings.get("debug_plot"))
-    
\ No newline at end of file
+    write_telemetry(db, settings)
+    return predictions
@@ -0,0 +1,121 @@
+import io
+import os
+import sys
+import json
+import argparse
+import socketserver
+from contextlib import redirect_stdout, redirect_stderr
+
+from ..utils import logger, Colors, MyParser
+from ..utils.logger import handler
+# Imported here so that the heavy dependencies are loaded once at startup
+from . import check_time_main
+from .check_time_cli import check_time_cli
+from .check_time_client import default_socket
+
+description = """
+{yellow}Description:{reset}
+Long running service that executes check_time requests, the imports and the
+connections to the DB are kept warm between the checks.
+The requests can be sent with `bin/check_time_client` which accepts the same
+arguments of `bin/check_time`.
+
+The protocol is one json per line, the client sends
+{blue}{{"argv": ["--window=1w", ...]}}{reset}
+and the service answers with
+{blue}{{"stdout": "OK: ...", "stderr": "", "exit_code": 0}}{reset}
+
+The checks are executed one at a time, to run them in parallel start more
+services on different sockets.
+The socket is only accessible by the user running the service, as the
+checks can write files (e.g. `--debug-plot` or `--state-dir`) as that user.
+""".format(
+    blue=Colors.BLUE,
+    yellow=Colors.YELLOW,
+    reset=Colors.RESET,
+)
+
+def run_check(argv):
+    """Run check_time_cli with the given arguments and return what it would
+    have printed and its exit code.
+    The handler of the logger keeps the stream it was created with, so it
+    is pointed to the captured stderr too for the duration of the check."""
+    stdout, stderr = io.StringIO(), io.StringIO()
+    exit_code = 0
+    previous = handler.setStream(stderr)
+    with redirect_stdout(stdout), redirect_stderr(stderr):
+        try:
+            check_time_cli(argv)
+        except SystemExit as e:
+            if e.code is None:
+                exit_code = 0
+            elif isinstance(e.code, int):
+                exit_code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                exit_code = 1
+        except Exception as e:
+            logger.exception("The check failed")
+            print("UNKNOWN: {}".format(e))
+            exit_code = 3
+        finally:
+            handler.setStream(previous)
+    return {
+        "stdout":stdout.getvalue(),
+        "stderr":stderr.getvalue(),
+        "exit_code":exit_code,
+    }
+
+class CheckTimeHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode())
+            argv = [str(arg) for arg in request["argv"]]
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error("Invalid request: %s", e)
+            response = {"stdout":"", "stderr":"invalid request: {}\n".format(e), "exit_code":3}
+        else:
+            logger.info("Running check_time with %s", argv)
+            response = run_check(argv)
+        self.wfile.write((json.dumps(response) + "\n").encode())
+
+class UnixCheckTimeServer(socketserver.UnixStreamServer):
+    def server_bind(self):
+        # Remove the permissions of the group and the others before
+        # listening, so no other user can ever send requests
+        super().server_bind()
+        os.chmod(self.server_address, 0o600)
+
+def check_time_service(argv=None):
+    """The Cli adapter for the check_time service."""
+    parser = MyParser(
+        description=description,
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    default_fmt = " {}(default: %(default)s){}".format(Colors.YELLOW, Colors.RESET)
+
+    parser.add_argument(
+        "--socket",
+        help="Path of the unix socket to listen on.%s"%default_fmt,
+        type=str,
+        default=default_socket(),
+    )
+
+    args = vars(parser.parse_args(argv))
+
+    # The default directory is private, a given one is left as it is
+    os.makedirs(os.path.dirname(os.path.abspath(args["socket"])), mode=0o700, exist_ok=True)
+
+    if os.path.exists(args["socket"]):
+        os.unlink(args["socket"])
+    server = UnixCheckTimeServer(args["socket"], CheckTimeHandler)
+    logger.info("Listening on %s", args["socket"])
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        server.server_close()
+        if os.path.exists(args["socket"]):
+            os.unlink(args["socket"])
@@ -0,0 +1,108 @@
+import os
+from ..utils import logger
+
+# The debug plots are rendered outside of the prediction, possibly in
+# background, using the Agg backend directly so that no interactive backend
+# nor the global pyplot state are involved and the figures are freed as 
+# soon as they are saved.
+
+def render_async(function, *args):
+    """Run the rendering in a detached process, so the check can exit
+    with its status without waiting for the image to be written.
+    The process is forked twice so that it is not a child of the check
+    (no zombies in the service) and it is in its own session with the
+    standard streams on /dev/null, so that whoever reads the output of the
+    check gets the EOF right away. Its logs are therefore lost."""
+    pid = os.fork()
+    if pid != 0:
+        # The first child exits as soon as the renderer is forked
+        os.waitpid(pid, 0)
+        return
+    try:
+        os.setsid()
+        if os.fork() == 0:
+            devnull = os.open(os.devnull, os.O_RDWR)
+            for fd in range(3):
+                os.dup2(devnull, fd)
+            log_errors(function, *args)
+    finally:
+        # Skip the atexit handlers and the buffers inherited from the check
+        os._exit(0)
+
+def log_errors(function, *args):
+    try:
+        function(*args)
+    except Exception:
+        logger.exception("Could not render the debug plot")
+
+def new_figure(rows=1):
+    # The imports are here so that if this feature is not needed, you don't
+    # have to install matplotlib
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    figure = Figure(figsize=(10, 5 * rows), dpi=150)
+    FigureCanvasAgg(figure)
+    return figure
+
+def save_plot(path, x, y, prediction):
+    """Plot the data and the `Prediction` and save the image to `path`"""
+    figure = new_figure()
+    plot_prediction(figure.add_subplot(111), x, y, prediction)
+    figure.savefig(path)
+    figure.clear()
+    logger.info("Saved the debug plot to '%s'", path)
+
+def save_report(path, series):
+    """Plot many series in a single image, `series` is a list of
+    `(title, x, y, prediction)`"""
+    if len(series) == 0:
+        return
+    figure = new_figure(rows=len(series))
+    for i, (title, x, y, prediction) in enumerate(series):
+        ax = figure.add_subplot(len(series), 1, i + 1)
+        plot_prediction(ax, x, y, prediction)
+        ax.set_title(title)
+    figure.tight_layout()
+    figure.savefig(path)
+    figure.clear()
+    logger.info("Saved the debug report of %s series to '%s'", len(series), path)
+
+def plot_prediction(ax, x, y, prediction):
+    m, q, time_predicted = prediction.m, prediction.q, prediction.time_predicted
+
+    if time_predicted is not None:
+        ax.plot(
+            [time_predicted, time_predicted],
+            [-1, 1],
+            "--",
+            color="black",
+            alpha=0.5,
+        )
+        ax.plot(
+            [-1, time_predicted],
+            [1, 1],
+            "--",
+            color="black",
+            alpha=0.5,
+        )
+
+    ax.plot(x, y, label="data")
+    ax.plot(x, m * x + q, label="fitting")
+
+    if time_predicted is not None:
+        ax.plot(
+            [x[-1], time_predicted],
+            [m * x[-1] + q, m * time_predicted + q],
+            "--", 
+            label="prediction"
+        )
+        ax.set_xlabel("Seconds (from first point of the query) the predicted time is %s"%time_predicted)
+    else:
+        ax.set_xlabel("Seconds (from first point of the query)")
+
+    ax.set_ylim(-0.1, 1.1)
+    ax.set_ylabel("Values normalized between 0 and 1")
+
+    ax.legend(bbox_to_anchor=(0.5, 1), loc='lower center',
+        ncol=3, fancybox=True, shadow=True
+    )
@@ -0,0 +1,84 @@
+import numpy as np
+
+# The estimators take the timestamps `x` and the values `y` as 1D np arrays
+# and return the slope `m` and the intercept `q` of the fitted line.
+# All of them run in linear time (or better) in the number of points.
+
+def bayesian_ridge(x, y):
+    """The sklearn BayesianRidge regressor"""
+    # The import is here so that sklearn is loaded only if this estimator
+    # is used
+    from sklearn.linear_model import BayesianRidge
+    reg = BayesianRidge()
+    reg.fit(x.reshape(-1, 1), y)
+    return reg.coef_[0], reg.intercept_
+
+def ols(x, y):
+    """Closed form ordinary least squares"""
+    return weighted_ols(x, y, np.ones_like(y, dtype=np.float64))
+
+def weighted_ols(x, y, w):
+    """Closed form weighted least squares, the times are centered to keep
+    the sums numerically stable"""
+    x_mean = np.average(x, weights=w)
+    y_mean = np.average(y, weights=w)
+    dx = x - x_mean
+    var = np.sum(w * dx * dx)
+    if var == 0:
+        return 0.0, y_mean
+    m = np.sum(w * dx * (y - y_mean)) / var
+    return m, y_mean - m * x_mean
+
+def huber(x, y, epsilon=1.35, max_iter=30, tol=1e-8):
+    """Huber regression fitted with iteratively reweighted least squares,
+    the points with residuals bigger than `epsilon` times the (MAD) scale
+    are down-weighted so spikes and drops do not drag the line.
+    The number of iterations is capped to `max_iter`."""
+    m, q = ols(x, y)
+    for _ in range(max_iter):
+        residuals = y - (m * x + q)
+        scale = np.median(np.abs(residuals - np.median(residuals))) / 0.6745
+        if scale == 0:
+            break
+        u = np.abs(residuals) / (epsilon * scale)
+        w = 1.0 / np.maximum(u, 1)
+        new_m, new_q = weighted_ols(x, y, w)
+        converged = abs(new_m - m) <= tol * max(abs(m), 1e-12)
+        m, q = new_m, new_q
+        if converged:
+            break
+    return m, q
+
+def theil_sen(x, y, max_pairs=10000, seed=0):
+    """Theil-Sen estimator, the slope is the median of the slopes between
+    pairs of points and the intercept the median of `y - m x`.
+    If there are more than `max_pairs` pairs, only `max_pairs` random pairs
+    are used so the cost does not depend on the number of points."""
+    n = x.size
+    if n * (n - 1) // 2 <= max_pairs:
+        i, j = np.triu_indices(n, k=1)
+    else:
+        rng = np.random.RandomState(seed)
+        i = rng.randint(0, n, size=max_pairs)
+        j = rng.randint(0, n, size=max_pairs)
+    dx = x[j] - x[i]
+    mask = dx != 0
+    if not mask.any():
+        return 0.0, np.median(y)
+    m = np.median((y[j] - y[i])[mask] / dx[mask])
+    return m, np.median(y - m * x)
+
+ESTIMATORS = {
+    "bayesian_ridge":bayesian_ridge,
+    "ols":ols,
+    "huber":huber,
+    "theil_sen":theil_sen,
+}
+
+def r2_score(x, y, m, q):
+    """The R^2 coefficient of the line `m x + q` on the data"""
+    ss_res = np.sum((y - (m * x + q)) ** 2)
+    ss_tot = np.sum((y - y.mean()) ** 2)
+    if ss_tot == 0:
+        return 1.0 if ss_res == 0 else 0.0
+    return 1 - ss_res / ss_tot
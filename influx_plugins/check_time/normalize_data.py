@@ -1,44 +1,92 @@
 import numpy as np
-from ..utils import parse_time_to_epoch
+from ..utils import parse_times_to_epoch
 
 def normalize_data(data, value_type, max_value):
     """This methods expects data in the format:
-    [{'time':'2021-09-03T09:54:38.890352Z', 'value': 1.9, 'max': 2}]
+    [{'time':1630662878, 'value': 1.9, 'max': 2}]
 
-    where time could be either an iso date, a timestamp (both int or str),
-    and max is optional.
+    where time could be either an epoch (as returned by `DBAdapter.query`),
+    an iso date or a timestamp as str, and max is optional.
 
-    It returns two np arrays, the first one is the time in seconds while the 
+    It returns two np arrays, the first one is the time in seconds while the
     second is the value normalized between 0 and 1.
     """
-
     time = []
     values = []
+    maxs = []
 
-    # Dispatch how the value should be normalized
-    normalizer = {
-        "usage":            lambda v, max: v / float(max),
-        "usage_percentile": lambda v, max: v / 100,
-        "usage_quantile":   lambda v, max: v,
-        "free":             lambda v, max: 1 - (v / float(max)),
-        "free_percentile":  lambda v, max: 1 - (v / 100),
-        "free_quantile":    lambda v, max: 1 - v,
-    }[value_type]
-
-
-    # Dispatch the points into arrays once they are normalized
+    # Split the points in columns
     for point in data:
-        time.append(parse_time_to_epoch(point["time"]))
-        values.append(normalizer(float(point["value"]), point.get("max") or max_value))
+        time.append(point["time"])
+        values.append(point["value"])
+        maxs.append(point.get("max"))
+
+    return normalize_columns(time, values, maxs, value_type, max_value)
 
-    # Conver the values to np arrays, this conversion is needed because appending
-    # To a np array is not efficient nor easy
-    time = np.array(time)
-    values = np.array(values)
+def normalize_columns(time, values, maxs, value_type, max_value):
+    """Columnar version of `normalize_data`, it takes the time, value and
+    max columns (`maxs` can be None if the query has no max) and returns
+    the same two np arrays.
+    """
+    time = parse_times_to_epoch(time)
+    values = normalize_values(values, maxs, value_type, max_value)
 
     # normalize data by removing the minimum to get better numerical stability
     # this doesn't change the predicted values
-    time -= time.min()
+    time = time - time.min()
 
     return (time, values)
 
+def normalize_batches(batches, value_type, max_value):
+    """Normalize the `(tags, columns)` batches returned by the DBAdapter.
+    It returns a list of `(tags, time, values)`, one for each series, where
+    time is the absolute time in seconds, so only the columns of a batch
+    at a time are kept in memory."""
+    series = {}
+    for tags, columns in batches:
+        key = tuple(sorted((tags or {}).items()))
+        series.setdefault(key, (tags, [], []))
+        _, times, values = series[key]
+        times.append(parse_times_to_epoch(columns["time"]))
+        values.append(normalize_values(
+            columns["value"],
+            columns.get("max"),
+            value_type, 
+            max_value,
+        ))
+    return [
+        (tags, np.concatenate(times), np.concatenate(values))
+        for tags, times, values in series.values()
+    ]
+
+def normalize_values(values, maxs, value_type, max_value):
+    """Normalize the values between 0 and 1 following `value_type`.
+    The missing (or zero) max are replaced by `max_value`."""
+    values = np.asarray(values, dtype=np.float64)
+
+    if value_type in ["usage", "free"]:
+        if maxs is None:
+            maxs = np.full(values.shape, np.nan)
+        else:
+            maxs = np.asarray(maxs)
+            if maxs.dtype == object:
+                maxs = np.where(np.equal(maxs, None), np.nan, maxs)
+            maxs = maxs.astype(np.float64)
+        missing = np.isnan(maxs) | (maxs == 0)
+        if missing.any():
+            if max_value is None:
+                raise ValueError(
+                    "Some points have no max, you must pass either "
+                    "--max-column or --max-value"
+                )
+            maxs[missing] = max_value
+
+    # Dispatch how the value should be normalized
+    return {
+        "usage":            lambda v, max: v / max,
+        "usage_percentile": lambda v, max: v / 100,
+        "usage_quantile":   lambda v, max: v,
+        "free":             lambda v, max: 1 - (v / max),
+        "free_percentile":  lambda v, max: 1 - (v / 100),
+        "free_quantile":    lambda v, max: 1 - v,
+    }[value_type](values, maxs)
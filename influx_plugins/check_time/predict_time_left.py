@@ -1,8 +1,15 @@
-from ..utils import logger
+from ..utils import logger, telemetry
 import numpy as np
-from sklearn.linear_model import BayesianRidge
+from collections import namedtuple
+from .estimators import ESTIMATORS, r2_score
+from .debug_plot import save_plot, render_async
 
-def predict_time_left(x: np.array, y: np.array, debug_plot) -> (float, float):
+# The fitted line `m x + q`, `time_predicted` is when the line reaches 1 
+# (None if it never does) and `time_left` is how much time is left after 
+# the last point
+Prediction = namedtuple("Prediction", ["m", "q", "time_predicted", "time_left", "score"])
+
+def predict_time_left(x: np.array, y: np.array, debug_plot, estimator="bayesian_ridge") -> (float, float):
     """Given the timestamps (in seconds) as a numpy array `x`
     and the values as numpy array `y` (normalied between 0 and 1), 
     do a linear regression and return in how much time (in seconds)
@@ -11,24 +18,33 @@ def predict_time_left(x: np.array, y: np.array, debug_plot) -> (float, float):
     between 0 and 1. 
 
     `debug_plot` is by default None, if passed it should be the path for
-    the debug image to plot the data. E.g. `debug.png`.
+    the debug image to plot the data. E.g. `debug.png`. The image is rendered
+    in a detached process so the check doesn't wait for it.
+
+    `estimator` is the name of the regressor to use, one of 
+    `bayesian_ridge`, `ols`, `huber` and `theil_sen`.
     """
-    # The regressor accepts only 2D arrays
-    x = x.reshape(-1, 1)
-    # Create the regressor
-    reg = BayesianRidge()
-    # Fit the regressor on the data
-    reg.fit(x, y)
+    prediction = fit_time_left(x, y, estimator)
+
+    # Save a debug image that can be used for debugging propouses
+    if debug_plot is not None:
+        render_async(save_plot, debug_plot, x, y, prediction)
+
+    return prediction.time_left, prediction.score
 
-    # Extract the coefficients of the linear regression
-    m, q = reg.coef_[0], reg.intercept_
+def fit_time_left(x: np.array, y: np.array, estimator="bayesian_ridge") -> Prediction:
+    """Fit the line and return the `Prediction`, see `predict_time_left`"""
+    # Fit the regressor on the data and extract the coefficients
+    # of the linear regression
+    with telemetry.measure("fit", estimator=estimator, points=len(x)):
+        m, q = ESTIMATORS[estimator](x, y)
     # Compute how sure the regressor is that the data
     # fits the infered model, this is the R^2 coefficient
     # So it has max 1.0, a constant predictor will have
     # R^2 coefficient equal to 0.0 and the model can get
     # arbitrarly worse, for this reason we only keep
     # positive scores.
-    score = max(reg.score(x, y), 0)
+    score = max(r2_score(x, y, m, q), 0)
 
     logger.info(
         ("The coefficents predicted are m:'{m}' q:'{q}'"
@@ -41,27 +57,7 @@ def predict_time_left(x: np.array, y: np.array, debug_plot) -> (float, float):
             "The predicted line is not growing so it will "
             "never reach the max"
         )
-        # Save a debug image that can be used for debugging propouses
-        if debug_plot is not None:
-            # The import is here so that if this feature is not needed, you don't
-            # have to install matplotlib
-            import matplotlib.pyplot as plt
-
-            plt.figure(figsize=(10, 5), dpi=150)
-            ax = plt.subplot(111)
-
-            ax.plot(x, y, label="data")
-            ax.plot(x, reg.predict(x), label="fitting")
-
-            ax.set_ylim(-0.1, 1.1)
-            ax.set_xlabel("Seconds (from first point of the query)")
-            ax.set_ylabel("Values normalized between 0 and 1")
-
-            ax.legend(bbox_to_anchor=(0.5, 1), loc='lower center',
-                ncol=3, fancybox=True, shadow=True
-            )
-            plt.savefig(debug_plot)
-        return float("inf"), score
+        return Prediction(m, q, None, float("inf"), score)
 
     # Given the current fitted line, compute the interception
     # with the max
@@ -70,54 +66,8 @@ def predict_time_left(x: np.array, y: np.array, debug_plot) -> (float, float):
 
     # Compute the delta from the predicted value
     # and the last measurement
-    time_left = time_predicted - x[-1, 0]
+    time_left = time_predicted - x[-1]
 
     logger.info("The predicted time left is %s seconds with a score of %s%%", time_left, score * 100)
 
-
-    # Save a debug image that can be used for debugging propouses
-    if debug_plot is not None:
-        # The import is here so that if this feature is not needed, you don't
-        # have to install matplotlib
-        import matplotlib.pyplot as plt
-
-        plt.figure(figsize=(10, 5), dpi=150)
-        ax = plt.subplot(111)
-        ax.plot(
-            [time_predicted, time_predicted],
-            [-1, 1],
-            "--",
-            color="black",
-            alpha=0.5,
-        )
-        ax.plot(
-            [-1, time_predicted],
-            [1, 1],
-            "--",
-            color="black",
-            alpha=0.5,
-        )
-
-        ax.plot(x, y, label="data")
-        ax.plot(x, reg.predict(x), label="fitting")
-
-        ax.plot(
-            [x[-1], time_predicted],
-            [
-                reg.predict(np.array(x[-1]).reshape(-1, 1)), 
-                reg.predict(np.array(time_predicted).reshape(-1, 1))
-            ],
-            "--", 
-            label="prediction"
-        )
-
-        ax.set_ylim(-0.1, 1.1)
-        ax.set_xlabel("Seconds (from first point of the query) the predicted time is %s"%time_predicted)
-        ax.set_ylabel("Values normalized between 0 and 1")
-
-        ax.legend(bbox_to_anchor=(0.5, 1), loc='lower center',
-            ncol=3, fancybox=True, shadow=True
-        )
-        plt.savefig(debug_plot)
-
-    return time_left, score
\ No newline at end of file
+    return Prediction(m, q, time_predicted, time_left, score)
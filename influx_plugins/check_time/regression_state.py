@@ -0,0 +1,206 @@
+import os
+from time import time
+import numpy as np
+from ..utils import logger, settings_key, read_json, write_json
+from .normalize_data import normalize_batches
+
+# The settings that identify a check, if any of these changes the state
+# is rebuilt from scratch
+STATE_KEYS = [
+    "db_settings",
+    "db_type",
+    "measurement",
+    "filter",
+    "target_column",
+    "target_kpi",
+    "kpi_column",
+    "value_column",
+    "value_type",
+    "max_column",
+    "max_value",
+    "window",
+]
+
+# How many seconds before the previous run are read again at each run, so
+# that the points written late (e.g. by the flush interval of the agents)
+# are not missed
+OVERLAP = 300
+
+class RegressionState:
+    """The sufficient statistics of a linear regression over a sliding window.
+
+    All the sums are computed on the times shifted by `reference`, which is
+    moved to the start of the window at each run to keep the sums small
+    and the fit numerically stable.
+
+    The db returns the times truncated to the second, so the ranges read
+    are always bounded by whole seconds. The last `OVERLAP` seconds are
+    read again at each run, so the points read in that range (`recent_x`
+    and `recent_y`) are kept to be removed before adding them again.
+    """
+
+    FIELDS = ["n", "sx", "sy", "sxx", "sxy", "syy"]
+
+    def __init__(self, key, reference):
+        self.key = key
+        self.reference = reference
+        self.window_start = reference
+        self.fetched_until = reference
+        self.last_time = None
+        self.recent_x = np.array([])
+        self.recent_y = np.array([])
+        self.n = 0
+        self.sx = 0.0
+        self.sy = 0.0
+        self.sxx = 0.0
+        self.sxy = 0.0
+        self.syy = 0.0
+
+    def add(self, x, y, sign=1):
+        """Add (or remove with `sign=-1`) the points to the statistics"""
+        if x.size == 0:
+            return
+        x = x - self.reference
+        self.n   += sign * x.size
+        self.sx  += sign * x.sum()
+        self.sy  += sign * y.sum()
+        self.sxx += sign * (x * x).sum()
+        self.sxy += sign * (x * y).sum()
+        self.syy += sign * (y * y).sum()
+
+    def remove(self, x, y):
+        self.add(x, y, sign=-1)
+
+    def rebase(self, reference):
+        """Shift the statistics so that they are relative to `reference`"""
+        delta = reference - self.reference
+        self.sxx += -2 * delta * self.sx + self.n * delta ** 2
+        self.sxy -= delta * self.sy
+        self.sx  -= self.n * delta
+        self.reference = reference
+
+    def fit(self):
+        """Return the slope, the intercept (relative to `reference`) and the
+        R^2 coefficient of the ordinary least squares fit."""
+        var_x = self.sxx - self.sx ** 2 / self.n
+        var_y = self.syy - self.sy ** 2 / self.n
+        cov = self.sxy - self.sx * self.sy / self.n
+        if var_x <= 0:
+            return 0.0, self.sy / self.n, 0.0
+        m = cov / var_x
+        q = (self.sy - m * self.sx) / self.n
+        score = cov ** 2 / (var_x * var_y) if var_y > 0 else 1.0
+        return m, q, min(max(score, 0), 1)
+
+    @classmethod
+    def load(cls, path, key):
+        """Load the state, returns None if the file does not exist or if
+        it belongs to another check."""
+        data = read_json(path)
+        if data is None or data.get("key") != key or "recent_x" not in data:
+            return None
+        state = cls(key, data["reference"])
+        state.window_start = data["window_start"]
+        state.fetched_until = data["fetched_until"]
+        state.last_time = data["last_time"]
+        state.recent_x = np.array(data["recent_x"], dtype=np.float64)
+        state.recent_y = np.array(data["recent_y"], dtype=np.float64)
+        for field in cls.FIELDS:
+            setattr(state, field, data[field])
+        return state
+
+    def save(self, path):
+        data = {
+            field:getattr(self, field)
+            for field in ["key", "reference", "window_start", "fetched_until", "last_time"] + self.FIELDS
+        }
+        data["n"] = int(data["n"])
+        data["recent_x"] = self.recent_x.tolist()
+        data["recent_y"] = self.recent_y.tolist()
+        for field in ["sx", "sy", "sxx", "sxy", "syy"]:
+            data[field] = float(data[field])
+        write_json(path, data)
+
+
+def fetch_points(db, settings, start, end):
+    """Read the points with `start < time <= end` and return the absolute
+    times in seconds and the normalized values.
+    The points are never downsampled, as the buckets would not match
+    between the points added and the ones removed."""
+    settings = dict(settings, max_points=None)
+    series = normalize_batches(
+        db.get_check_time_data(settings, time_range=(start, end)),
+        settings["value_type"],
+        settings.get("max_value"),
+    )
+    if len(series) == 0:
+        return np.array([]), np.array([])
+    _, x, y = series[0]
+    return x.astype(np.float64), y
+
+def incremental_time_left(db, settings):
+    """Compute the same prediction of `predict_time_left` (using ordinary
+    least squares) but updating the statistics stored in `settings["state_dir"]`
+    so that only the points that entered or left the window since the last
+    run, and the last `OVERLAP` seconds before it, are read from the db.
+
+    Points written more than `OVERLAP` seconds late are not seen until the
+    state is rebuilt, which happens when the settings change or when the
+    last point seen is older than the window."""
+    key = settings_key(settings, STATE_KEYS)
+    path = os.path.join(settings["state_dir"], "{}.json".format(key))
+
+    now = int(time())
+    window_start = now - int(settings["window"])
+
+    state = RegressionState.load(path, key)
+    if state is None or state.last_time is None or state.last_time <= window_start:
+        logger.info("Building the regression state from scratch")
+        state = RegressionState(key, window_start)
+        x, y = fetch_points(db, settings, window_start, now)
+    else:
+        logger.info("Updating the regression state '%s'", path)
+        state.remove(*fetch_points(db, settings, state.window_start, window_start))
+        # Read again the end of the previous run, replacing the points
+        # already added with the ones there are now
+        since = max(state.fetched_until - OVERLAP, window_start)
+        recent = state.recent_x > since
+        state.remove(state.recent_x[recent], state.recent_y[recent])
+        x, y = fetch_points(db, settings, since, now)
+
+    state.add(x, y)
+    recent = x > now - OVERLAP
+    state.recent_x, state.recent_y = x[recent], y[recent]
+    if x.size != 0:
+        state.last_time = max(float(x.max()), state.last_time or x.max())
+    state.window_start = window_start
+    state.fetched_until = now
+    state.rebase(window_start)
+    state.save(path)
+
+    logger.info("Got %s new points, the window has %s points", x.size, state.n)
+
+    if state.n == 0:
+        logger.error("Got no point!")
+        return float("inf"), 0.0
+
+    m, q, score = state.fit()
+
+    logger.info(
+        ("The coefficents predicted are m:'{m}' q:'{q}'"
+        " with score:'{score}'")
+        .format(**locals())
+    )
+
+    if m <= 0:
+        logger.info(
+            "The predicted line is not growing so it will "
+            "never reach the max"
+        )
+        return float("inf"), score
+
+    time_left = (1 - q) / m - (state.last_time - state.reference)
+
+    logger.info("The predicted time left is %s seconds with a score of %s%%", time_left, score * 100)
+
+    return time_left, score
@@ -0,0 +1,94 @@
+import os
+from time import time
+from ..utils import logger, settings_key, read_json, write_json
+
+# The settings that identify a prediction
+CACHE_KEYS = [
+    "db_settings",
+    "db_type",
+    "measurement",
+    "filter",
+    "target_column",
+    "target_kpi",
+    "kpi_column",
+    "value_column",
+    "value_type",
+    "max_column",
+    "max_value",
+    "window",
+    "max_points",
+    "estimator",
+    "state_dir",
+    "series_cache_dir",
+]
+
+class ResultCache:
+    """A cache of the `(time_predicted, score)` of the checks, stored as one
+    small json file per check in `directory`.
+
+    The files are written atomically, so several processes can read and
+    write the cache at the same time, at worst they compute the same
+    prediction twice. When there are more than `max_entries` files the
+    oldest are removed in bulk, down to `EVICT_RATIO` of them, so that most
+    writes only count the files.
+    """
+
+    EVICT_RATIO = 0.9
+
+    def __init__(self, directory, ttl, max_entries):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def path(self, settings):
+        return os.path.join(
+            self.directory,
+            "{}.json".format(settings_key(settings, CACHE_KEYS))
+        )
+
+    def get(self, settings):
+        """Return the cached `(time_predicted, score)` or None if it's missing
+        or older than the ttl, the time left is reduced by the age of the
+        entry"""
+        entry = read_json(self.path(settings))
+        if entry is None:
+            return None
+        age = time() - entry["time"]
+        if not 0 <= age <= self.ttl:
+            return None
+        logger.info("Using the prediction cached %.1f seconds ago", age)
+        return entry["time_predicted"] - age, entry["score"]
+
+    def put(self, settings, time_predicted, score):
+        write_json(self.path(settings), {
+            "time":time(),
+            "time_predicted":float(time_predicted),
+            "score":float(score),
+        })
+        if len(os.listdir(self.directory)) > self.max_entries:
+            self.evict()
+
+    def evict(self):
+        """Remove the oldest entries until there are at most `EVICT_RATIO`
+        of `max_entries`"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                # Another process removed it
+                continue
+
+        keep = int(self.max_entries * self.EVICT_RATIO)
+        if len(entries) <= keep:
+            return
+
+        entries.sort()
+        for _, path in entries[:len(entries) - keep]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
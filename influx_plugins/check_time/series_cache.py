@@ -0,0 +1,111 @@
+import os
+import fcntl
+from time import time
+import numpy as np
+from ..utils import logger, settings_key, atomic_write, read_json, write_json
+from .regression_state import STATE_KEYS, OVERLAP, fetch_points
+
+class SeriesCache:
+    """A local copy of the normalized series of a check.
+
+    The times and the values are kept as raw float64 files which are only
+    appended to and memory-mapped on load, the points before `start` are
+    outside of the window and are dropped from the files only once they
+    are more than half of them.
+    The metadata (`start`, `count` and `fetched_until`) is in a json next
+    to them and a lock file serializes the processes updating the same check.
+    The files are memory-mapped only while holding the lock, as each run
+    truncates them to replace the last points, and they are compacted with
+    `atomic_write`.
+    """
+
+    def __init__(self, directory, key):
+        os.makedirs(directory, exist_ok=True)
+        self.prefix = os.path.join(directory, "{}.series".format(key))
+        self.key = key
+
+    def path(self, extension):
+        return "{}.{}".format(self.prefix, extension)
+
+    def load_meta(self):
+        meta = read_json(self.path("json"))
+        if meta is None or meta.get("key") != self.key or any(
+            not os.path.exists(self.path(extension))
+            or os.path.getsize(self.path(extension)) < meta["count"] * 8
+            for extension in ["time", "value"]
+        ):
+            return {"key":self.key, "start":0, "count":0, "fetched_until":None}
+        return meta
+
+    def append(self, meta, x, y):
+        """Append the points, dropping anything written after `count` by
+        a run that did not complete."""
+        for extension, values in [("time", x), ("value", y)]:
+            with open(self.path(extension), "ab") as f:
+                f.truncate(meta["count"] * 8)
+                f.write(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+        meta["count"] += x.size
+
+    def read(self, meta):
+        """Memory-map the points from `start` to `count`"""
+        size = meta["count"] - meta["start"]
+        if size == 0:
+            return np.array([]), np.array([])
+        return tuple(
+            np.memmap(
+                self.path(extension), dtype=np.float64, mode="r",
+                offset=meta["start"] * 8, shape=(size,)
+            )
+            for extension in ["time", "value"]
+        )
+
+    def compact(self, meta):
+        """Rewrite the files without the points before `start`"""
+        for extension, values in zip(["time", "value"], self.read(meta)):
+            atomic_write(self.path(extension), np.ascontiguousarray(values, dtype=np.float64).tobytes())
+        meta["count"] -= meta["start"]
+        meta["start"] = 0
+
+def cached_series(db, settings):
+    """Return the absolute times and the normalized values of the last
+    `window` seconds, reading from the db only the points newer than the
+    ones already in the cache in `settings["series_cache_dir"]`.
+    The last `OVERLAP` seconds cached are read again to get the points that
+    were written late."""
+    cache = SeriesCache(settings["series_cache_dir"], settings_key(settings, STATE_KEYS))
+
+    now = int(time())
+    window_start = now - int(settings["window"])
+
+    with open(cache.path("lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        meta = cache.load_meta()
+        if meta["fetched_until"] is None or meta["fetched_until"] <= window_start:
+            logger.info("Filling the series cache from scratch")
+            meta = {"key":cache.key, "start":0, "count":0, "fetched_until":window_start}
+
+        # Replace the last points with the ones read again from the db,
+        # which also include the ones written late
+        since = max(meta["fetched_until"] - OVERLAP, window_start)
+        times, _ = cache.read(meta)
+        meta["count"] = meta["start"] + int(np.searchsorted(times, since, side="right"))
+        del times
+
+        x, y = fetch_points(db, settings, since, now)
+        logger.info("Got %s new points", x.size)
+        cache.append(meta, x, y)
+        meta["fetched_until"] = now
+
+        # Drop the points that left the window
+        times, _ = cache.read(meta)
+        meta["start"] += int(np.searchsorted(times, window_start, side="right"))
+        del times
+        if meta["start"] > (meta["count"] - meta["start"]):
+            cache.compact(meta)
+
+        write_json(cache.path("json"), meta)
+
+        # The points are copied while holding the lock, as the next run
+        # rewrites the last ones in place
+        return tuple(np.array(values) for values in cache.read(meta))
@@ -3,6 +3,11 @@ import json
 from .logger import logger, setLevel
 from .db_adapter import DBAdapter
 from .time_parsing import *
+from .local_store import settings_key, atomic_write, read_json, write_json
+from .batch_writer import BatchWriter
+from .line_protocol import columns_to_lines
+from .async_db_adapter import AsyncDBAdapter
+from .telemetry import telemetry, format_group
 
 copyrights = """influx_plugins is a free software developed by Tommaso Fontana for Wurth Phoenix S.r.l. under GPL-2 License."""
 
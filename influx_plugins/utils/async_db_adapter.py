@@ -0,0 +1,57 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from .db_adapter import DBAdapter
+
+class AsyncDBAdapter:
+    """The asyncio counterpart of DBAdapter, with the same methods as
+    coroutines, so that the queries of many selector groups can be in
+    flight at the same time.
+
+    The influxdb client is blocking, so each call runs the DBAdapter method
+    in a pool of `concurrency` threads, and a semaphore keeps at most
+    `concurrency` calls running at once. The threads share the pooled client,
+    whose HTTP session keeps up to `concurrency` connections open.
+    """
+
+    def __init__(self, db_settings, db_schema, concurrency=8):
+        if concurrency <= 0:
+            raise ValueError("The concurrency must be positive, got {}".format(concurrency))
+        self.db = DBAdapter(dict(db_settings, pool_size=max(concurrency, 10)), db_schema)
+        self.concurrency = concurrency
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.semaphore = None
+
+    async def run(self, function, *args, **kwargs):
+        """Run the blocking function in the thread pool"""
+        # The semaphore must be created inside the running loop
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        async with self.semaphore:
+            return await asyncio.get_event_loop().run_in_executor(
+                self.executor,
+                lambda: function(*args, **kwargs),
+            )
+
+    async def query(self, query):
+        """Run a query in the language of the backend and return the list
+        of its `(tags, columns)` batches"""
+        return await self.run(lambda: list(self.db.query_batches(query)))
+
+    async def get_selectors_combinations(self, query_settings):
+        return await self.run(self.db.get_selectors_combinations, query_settings)
+
+    async def get_training_data(self, selector_values, query_settings):
+        return await self.run(self.db.get_training_data, selector_values, query_settings)
+
+    async def get_all_training_data(self, selectors_groups, query_settings):
+        return await self.run(self.db.get_all_training_data, selectors_groups, query_settings)
+
+    async def get_anomaly_data(self, selector_values, query_settings):
+        return await self.run(self.db.get_anomaly_data, selector_values, query_settings)
+
+    async def write_points(self, points, **kwargs):
+        return await self.run(self.db.write_points, points, **kwargs)
+
+    def close(self):
+        """Wait for the running calls and stop the threads"""
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,106 @@
+import queue
+import threading
+from time import perf_counter
+from .logger import logger
+from .telemetry import telemetry
+
+class BatchWriter:
+    """Write points to the db from a background thread.
+
+    The points of all the calls to `write` are collected and sent in batches
+    of `batch_size` points, with second precision and integer timestamps.
+    With `protocol="line"` the points are lines of line protocol, as made by
+    `columns_to_lines`, which are batched as they are.
+    At most `queue_size` batches wait to be sent, when the queue is full
+    `write` blocks until the thread catches up, so the memory used is bounded.
+
+    A batch that fails is logged and counted, the writer keeps going with the
+    next ones. `close` sends what is left, waits for the thread and returns
+    the stats of the writes.
+    """
+
+    def __init__(self, db, batch_size=5000, queue_size=8, protocol="json"):
+        if batch_size <= 0:
+            raise ValueError("The batch size must be positive, got {}".format(batch_size))
+        if protocol not in ("json", "line"):
+            raise ValueError("The protocol must be 'json' or 'line', got {}".format(protocol))
+        self.protocol = protocol
+        self.db = db
+        self.batch_size = batch_size
+        self.buffer = []
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stats = {
+            "points":0,
+            "batches":0,
+            "failed_points":0,
+            "failed_batches":0,
+            "seconds":0.0,
+        }
+        self.thread = threading.Thread(target=self.run, name="BatchWriter")
+        self.thread.start()
+
+    def write(self, points):
+        """Queue the points, their time must be an epoch in seconds"""
+        if self.protocol == "line":
+            self.buffer.extend(points)
+            while len(self.buffer) >= self.batch_size:
+                self.queue.put(self.buffer[:self.batch_size])
+                self.buffer = self.buffer[self.batch_size:]
+            return
+        for point in points:
+            point["time"] = int(point["time"])
+            self.buffer.append(point)
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """Queue the points collected so far as a batch"""
+        if len(self.buffer) != 0:
+            self.queue.put(self.buffer)
+            self.buffer = []
+
+    def run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                return
+            start = perf_counter()
+            try:
+                self.db.write_points(
+                    batch, time_precision="s", batch_size=self.batch_size, protocol=self.protocol,
+                )
+                self.stats["points"] += len(batch)
+                self.stats["batches"] += 1
+            except Exception as e:
+                logger.error("Failed to write a batch of %s points: %s", len(batch), e)
+                self.stats["failed_points"] += len(batch)
+                self.stats["failed_batches"] += 1
+            seconds = perf_counter() - start
+            self.stats["seconds"] += seconds
+            telemetry.record("write", seconds, points=len(batch))
+
+    def close(self):
+        """Send the remaining points, wait for all the writes and log the
+        throughput"""
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+
+        stats = self.stats
+        logger.info(
+            "Wrote %s points in %s batches in %.2f seconds (%.0f points/s)",
+            stats["points"], stats["batches"], stats["seconds"],
+            stats["points"] / stats["seconds"] if stats["seconds"] > 0 else 0,
+        )
+        if stats["failed_batches"] != 0:
+            logger.error(
+                "Failed to write %s points in %s batches",
+                stats["failed_points"], stats["failed_batches"],
+            )
+        return stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
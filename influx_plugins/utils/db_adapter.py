@@ -1,19 +1,86 @@
 from .logger import logger
-import itertools
-import numpy as np
-import pandas as pd
-from influxdb import InfluxDBClient
+from .time_parsing import time_to_epoch
+from .telemetry import telemetry, format_group
+import json
+import atexit
+
+# The backends that can be selected with the `backend` db setting, their
+# modules are imported only when used
+BACKENDS = {
+    "influxql":("influxql_backend", "InfluxQLBackend"),
+    "flux":("flux_backend", "FluxBackend"),
+}
+
+class ConnectionPool:
+    """Keeps one backend, and so one HTTP session, for each set of
+    connection settings (backend, host, port, credentials, database, ...)
+    so that all the reads and the writes of a run share the same connections.
+    It also remembers which databases were already created in this run."""
+
+    def __init__(self):
+        self.backends = {}
+        self.created_databases = set()
+
+    def get_backend(self, settings, chunk_size):
+        key = json.dumps([settings, chunk_size], sort_keys=True)
+        if key not in self.backends:
+            backend = settings.get("backend", "influxql")
+            if backend not in BACKENDS:
+                raise ValueError("Unknown backend '{}', the available ones are: {}".format(
+                    backend, ", ".join(BACKENDS)
+                ))
+            module, name = BACKENDS[backend]
+            import importlib
+            from .replay_backend import with_recording
+            cls = getattr(importlib.import_module("." + module, __package__), name)
+            cls = with_recording(cls, settings)
+            logger.info("Conneting to the DB on [{}:{}] for the database [{}] with the {} backend".format(
+                settings.get("host"), settings.get("port"), settings["database"], backend
+            ))
+            self.backends[key] = cls(settings, chunk_size)
+        return self.backends[key]
+
+    def ensure_database(self, settings, backend):
+        """Create the database of the settings, only the first time"""
+        key = (settings.get("backend"), settings.get("host"), settings.get("port"), settings["database"])
+        if key not in self.created_databases:
+            backend.ensure_database()
+            self.created_databases.add(key)
+
+    def close(self):
+        """Close all the connections"""
+        for backend in self.backends.values():
+            backend.close()
+        self.backends = {}
+
+# The pool shared by all the DBAdapters of the process
+connections = ConnectionPool()
+atexit.register(connections.close)
 
 class DBAdapter:
+    """Reads the data needed by the plugins and writes their results.
+
+    The queries are built and run by the backend chosen with the `backend`
+    db setting: `influxql` (the default) for InfluxDB 1.x or `flux` for
+    InfluxDB 2.x. The data is returned as `(tags, columns)` batches, where
+    columns is a dict of np arrays with the `time` as epochs in seconds.
+
+    With the `record_dir` setting the results of the queries are also saved
+    there, with `replay_dir` they are read from there instead of the db."""
+
     def __init__(self, db_settings, db_schema):
         # Only keep the relevant settings
         filtered_settings = {
             k: v
             for k, v in db_settings.items()
             if k in [
+                "backend",
                 "database",
                 "host",
                 "port",
+                "url",
+                "org",
+                "token",
                 "username",
                 "password",
                 "ssl",
@@ -22,177 +89,265 @@ class DBAdapter:
                 "retries",
                 "use_udp",
                 "udp_port",
+                "udp_mtu",
+                "udp_rate",
                 "proxies",
                 "cert",
+                "pool_size",
+                "record_dir",
+                "replay_dir",
             ]
         }
         self.settings = filtered_settings
         self.db_schema = db_schema
-        logger.info("Conneting to the DB on [{host}:{port}] for the database [{database}]".format(**self.settings))
-        self.client = InfluxDBClient(**self.settings)
-
-    def query(self, query, *args, **kwargs):
-        logger.info("Executing query:\n%s", query)
-        result = self.client.query(
-            query,
-            *args,
-            **kwargs
-        )
-        logger.info("Got %s points", len(result))
-        return result
+        # How many points are read at once by the streaming queries
+        self.chunk_size = db_settings.get("chunk_size", 10000)
+        self.backend = connections.get_backend(self.settings, self.chunk_size)
+
+    def query_batches(self, query):
+        """Run a query in the language of the backend and yield its
+        `(tags, columns)` batches"""
+        return telemetry.measure_batches("query", self.backend.query_batches(query))
+
+    def query_columns(self, query):
+        """Run a query in the language of the backend and return the columns
+        of all its series joined, as a dict of np arrays"""
+        return concatenate_columns(self.query_batches(query))
+
+    def query_dataframe(self, query):
+        """Run a query in the language of the backend and return a DataFrame
+        with the columns of all its series and the time as DatetimeIndex"""
+        return to_dataframe(self.query_columns(query))
+
+    def write_points(self, points, create_database=True, **kwargs):
+        """Write the points to the database, creating it the first time
+        unless `create_database` is False"""
+        if create_database:
+            connections.ensure_database(self.settings, self.backend)
+        return self.backend.write_points(points, **kwargs)
 
     def get_selectors_combinations(self, query_settings):
-        """Takes the list of selectors and """
+        """Return the combinations of the values of the selectors as a list
+        of dicts"""
         logger.info("Finding all the combinations of the selectors fields")
-        if query_settings["filter"] != "":
-            query_settings["extra_filter"] = "AND " + query_settings["filter"]
-        else:
-            query_settings["extra_filter"] = ""
-
-        return [ dict(x) for x in (itertools.product(*[
-            [
-                (selector, x["selector"])
-                for x in self.query(
-"""
-SELECT DISTINCT({selector}) as selector
-FROM (
-    SELECT *
-    FROM {input_measurement}
-    WHERE (
-        time > (now() - {window})
-        {extra_filter}
-    )
-)
-""".format(selector=selector, **query_settings)                
-                ).get_points()
-            ]
-            for selector in query_settings["selectors"].split(",")
-        ]))]
-
+        with telemetry.measure("selectors_query") as fields:
+            combinations = self.backend.tag_combinations(
+                query_settings["input_measurement"],
+                query_settings["selectors"].split(","),
+                time_to_epoch(query_settings["window"]),
+                query_settings["filter"],
+                query_settings["field"],
+            )
+            fields["groups"] = len(combinations)
+        return combinations
 
     def get_anomaly_data(self, selector_values, query_settings):
-        """Get the data and compute the warning and anomaly quantiles
-        for each hour of each day of the week."""
-        selector_filters = "".join(
-            "AND {} = '{}' ".format(k, v)
-            for k, v in selector_values.items()
-        )
-        return self.query(
-"""
-SELECT {field} as value
-FROM {input_measurement}
-WHERE (
-    time > (now() - {window})
-    {selector_filters}
-    {extra_filter}
-)
-""".format(selector_filters=selector_filters, **query_settings)                
-            ).get_points()
+        """Return the `time` and `value` columns of the points to classify"""
+        return concatenate_columns(telemetry.measure_batches("anomaly_query", self.backend.read_series(
+            query_settings["input_measurement"],
+            [(query_settings["field"], "value")],
+            window=time_to_epoch(query_settings["window"]),
+            tag_filters=selector_values,
+            where=query_settings["filter"],
+        ), format_group(selector_values)))
 
     def get_training_data(self, selector_values, query_settings):
         """Get the data and compute the warning and anomaly quantiles
-        for each hour of each day of the week."""
-        selector_filters = "".join(
-            "AND {} = '{}' ".format(k, v)
-            for k, v in selector_values.items()
-        )
-        points = self.query(
-"""
-SELECT {field} as value
-FROM {input_measurement}
-WHERE (
-    time > (now() - {training_timeframe})
-    {selector_filters}
-    {extra_filter}
-)
-""".format(selector_filters=selector_filters, **query_settings)                
-                )
-        if len(points) == 0:
-            return {}
-                
-        df = pd.DataFrame([
-            (x["time"], x["value"])
-            for x in points.get_points()
-        ], columns=["time", "value"])
-
-        df = df.set_index("time")
-        df.index = pd.DatetimeIndex(df.index)
-        t = df.groupby(lambda x: (x.day_name(), x.hour)).quantile([
-            query_settings["warning"], 
-            query_settings["anomaly"], 
-        ])
-        t = t.stack().unstack(1).droplevel(1)
-        t.columns = ["warning", "anomaly"]
-        return {
-            key: {
-                "warning":warning,
-                "anomaly":anomaly,
-            }
-            for key, warning, anomaly in t.itertuples()
+        for each hour of each day of the week, see `compute_thresholds`."""
+        group = format_group(selector_values)
+        columns = concatenate_columns(telemetry.measure_batches("training_query", self.backend.read_series(
+            query_settings["input_measurement"],
+            [(query_settings["field"], "value")],
+            window=time_to_epoch(query_settings["training_timeframe"]),
+            tag_filters=selector_values,
+            where=query_settings["filter"],
+        ), group))
+
+        with telemetry.measure("training", group, points=len(columns["time"])):
+            return compute_thresholds(columns, query_settings)
+
+    def get_all_training_data(self, selectors_groups, query_settings):
+        """Get the data of all the selector groups with a single query
+        grouped by the selectors and compute the warning and anomaly
+        quantiles of each group for each hour of each day of the week.
+        It returns an array with the `(7, 24, 2)` thresholds of each group,
+        see `compute_thresholds`, in the same order of `selectors_groups`."""
+        import numpy as np
+        selectors = query_settings["selectors"].split(",")
+        index = {
+            tuple(selector_values[selector] for selector in selectors):i
+            for i, selector_values in enumerate(selectors_groups)
         }
 
+        groups, times, values = [], [], []
+        for tags, columns in telemetry.measure_batches("training_query", self.backend.read_series(
+            query_settings["input_measurement"],
+            [(query_settings["field"], "value")],
+            window=time_to_epoch(query_settings["training_timeframe"]),
+            where=query_settings["filter"],
+            group_by=selectors,
+        )):
+            i = index.get(tuple((tags or {}).get(selector, "") for selector in selectors))
+            if i is None:
+                continue
+            groups.append(np.full(len(columns["time"]), i, dtype=np.int64))
+            times.append(columns["time"])
+            values.append(columns["value"])
 
-    def get_check_time_data(self, query_settings):
-        """Take the settings ad depending on which schema the db is, retrieve
-        the data with the appropriate query."""
-        if query_settings["filter"] != "":
-            query_settings["extra_filter"] = "AND " + query_settings["filter"]
-        else:
-            query_settings["extra_filter"] = ""
-
-        if self.db_schema == "icinga" and query_settings.get("max_column") is not None:
-            return self.query(
-"""
-SELECT time, {target_column} as value, {max_column} as max
-FROM "{measurement}"
-WHERE (
-    time > (now() - {window}s)
-    {extra_filter}
-)
-""".format(**query_settings)
-            )
-        elif self.db_schema == "icinga" and query_settings.get("max_column") is None:
-            return self.query(
-"""
-SELECT time, {target_column} as value
-FROM "{measurement}"
-WHERE (
-    time > (now() - {window}s)
-    {extra_filter}
-)
-""".format(**query_settings)
-            )
-        elif self.db_schema == "telegraf" and query_settings.get("max_column") is None:
-            return self.query(
-"""
-SELECT time, {value_column} as value
-FROM "{measurement}"
-WHERE (
-    time > (now() - {window}s)
-    AND
-    {kpi_column} = '{target_kpi}'
-    {extra_filter}
-)
-""".format(**query_settings)
-            )
-        elif self.db_schema == "telegraf" and query_settings.get("max_column") is not None:
-            return self.query(
-"""
-SELECT time, {value_column} as value, {max_column} as max
-FROM "{measurement}"
-WHERE (
-    time > (now() - {window}s)
-    AND
-    {kpi_column} = '{target_kpi}'
-    {extra_filter}
-)
-""".format(**query_settings)
+        times = np.concatenate(times or [np.array([], dtype=np.int64)])
+        with telemetry.measure("training", points=len(times), groups=len(selectors_groups)):
+            return grouped_thresholds(
+                np.concatenate(groups or [np.array([], dtype=np.int64)]),
+                times,
+                np.concatenate(values or [np.array([])]),
+                len(selectors_groups),
+                query_settings,
             )
+
+    def get_check_time_data(self, query_settings, time_range=None, group_by=None):
+        """Take the settings ad depending on which schema the db is, retrieve
+        the data with the appropriate query.
+        It returns the `(tags, columns)` batches of the backend.
+        
+        By default the last `window` seconds are read, if `time_range` is
+        passed it should be a tuple `(start, end)` of epochs in seconds and
+        only the points with `start < time <= end` are read.
+
+        If `group_by` is a list of tags, the result has one series for 
+        each combination of their values.
+
+        If `max_points` is set, the data is averaged server side in buckets
+        so that each series has at most about `max_points` points."""
+        if self.db_schema == "icinga":
+            value_column = query_settings["target_column"]
+            tag_filters = {}
+        elif self.db_schema == "telegraf":
+            value_column = query_settings["value_column"]
+            tag_filters = {query_settings["kpi_column"]:query_settings["target_kpi"]}
         else:
             raise ValueError("Cannot handle query for schema %s with settings: %s"%(self.db_schema, query_settings))
 
+        columns = [(value_column, "value")]
+        if query_settings.get("max_column") is not None:
+            columns.append((query_settings["max_column"], "max"))
+
+        bucket = downsampling_bucket(query_settings["window"], query_settings.get("max_points"))
+        if bucket is not None:
+            logger.info("Downsampling the data in buckets of %ss", bucket)
+
+        return telemetry.measure_batches("query", self.backend.read_series(
+            query_settings["measurement"],
+            columns,
+            window=query_settings["window"],
+            time_range=time_range,
+            tag_filters=tag_filters,
+            where=query_settings["filter"],
+            group_by=group_by,
+            bucket=bucket,
+        ))
+
+# The number of hours in a week
+SLOTS = 7 * 24
+
+def compute_thresholds(columns, query_settings):
+    """Compute the warning and anomaly quantiles of the values for each
+    hour of each day of the week.
+    It returns a `(7, 24, 2)` array indexed by weekday (Monday is 0), hour
+    (in UTC) and warning / anomaly, the hours without data are nan."""
+    import numpy as np
+    return grouped_thresholds(
+        np.zeros(len(columns["time"]), dtype=np.int64),
+        columns["time"],
+        columns["value"],
+        1,
+        query_settings,
+    )[0]
+
+def grouped_thresholds(groups, times, values, groups_count, query_settings):
+    """Compute the thresholds, like `compute_thresholds`, of the values of
+    each group, where `groups` is the index of the group of each value.
+    It returns a `(groups_count, 7, 24, 2)` array."""
+    import numpy as np
+    thresholds = np.full((groups_count * SLOTS, 2), np.nan)
+    if len(times) != 0:
+        keys, quantiles = grouped_quantiles(
+            np.asarray(groups, dtype=np.int64) * SLOTS + time_slots(times),
+            values,
+            [query_settings["warning"], query_settings["anomaly"]],
+        )
+        thresholds[keys] = quantiles
+    return thresholds.reshape(groups_count, 7, 24, 2)
+
+def time_slots(times):
+    """Return the hour of the week, `weekday * 24 + hour` with Monday as 0,
+    of the epochs in seconds (in UTC)"""
+    import numpy as np
+    times = np.asarray(times, dtype=np.int64)
+    # The 1st of January 1970 was a Thursday
+    return ((times // 86400 + 3) % 7) * 24 + (times // 3600) % 24
+
+def grouped_quantiles(keys, values, quantiles):
+    """Compute the quantiles of the values with the same key, with linear
+    interpolation and ignoring the nans like `pandas` does.
+    It returns the sorted unique keys and an array with one row for each
+    of them and one column for each quantile."""
+    import numpy as np
+    keys = np.asarray(keys, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    quantiles = np.asarray(quantiles, dtype=np.float64)
+
+    # Sort by key and then by value, the nans go last in each key
+    order = np.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    unique, starts = np.unique(keys, return_index=True)
+    sizes = np.add.reduceat(~np.isnan(values), starts)
+
+    positions = quantiles[None, :] * (sizes[:, None] - 1)
+    low = np.maximum(np.floor(positions).astype(np.int64), 0)
+    high = np.minimum(low + 1, np.maximum(sizes[:, None] - 1, 0))
+    fraction = positions - low
+    low_values = values[starts[:, None] + low]
+    high_values = values[starts[:, None] + high]
+    result = low_values + (high_values - low_values) * fraction
+    # The keys with only nans have nan quantiles
+    result[sizes == 0] = np.nan
+    return unique, result
+
+def to_dataframe(columns):
+    """Convert the columns to a DataFrame with the time as DatetimeIndex"""
+    import pandas as pd
+    return pd.DataFrame(
+        {
+            name:values
+            for name, values in columns.items()
+            if name != "time"
+        },
+        index=pd.DatetimeIndex(pd.to_datetime(columns["time"], unit="s"), name="time"),
+    )
+
+def concatenate_columns(batches):
+    """Join the columns of all the batches"""
+    import numpy as np
+    columns = {}
+    for _, batch in batches:
+        for name, values in batch.items():
+            columns.setdefault(name, []).append(values)
+    return {
+        "time":np.concatenate(columns.pop("time", [np.array([], dtype=np.int64)])),
+        "value":np.concatenate(columns.pop("value", [np.array([])])),
+        **{
+            name:np.concatenate(values)
+            for name, values in columns.items()
+        }
+    }
 
-    def __del__(self):
-        """On exit / delation close the client connetion"""
-        if "client" in dir(self):
-            self.client.close()
+def downsampling_bucket(window, max_points):
+    """Return the size in seconds of the buckets needed to have at most
+    `max_points` points in `window` seconds, or None if no downsampling
+    is needed."""
+    if max_points is None or max_points <= 0:
+        return None
+    bucket = -(-int(window) // int(max_points))
+    if bucket <= 1:
+        return None
+    return bucket
@@ -0,0 +1,325 @@
+import re
+import csv
+import json
+from .logger import logger
+from .influxql_backend import unique_tag_sets
+
+class FluxBackend:
+    """The backend for InfluxDB 2.x (and 1.8 with flux enabled), it builds
+    Flux queries, sends them to `/api/v2/query` and decodes the annotated
+    CSV response while it's streamed, so only a chunk of `chunk_size` rows
+    at a time is held in memory, as np arrays.
+
+    The database of the settings is used as the bucket. The requests are
+    authenticated with the `token` setting, or with `username:password`
+    which is what InfluxDB 1.8 expects.
+    """
+
+    def __init__(self, settings, chunk_size):
+        # The imports are here so that the clis can parse the arguments
+        # without paying for them
+        import requests
+        import urllib3
+        urllib3.disable_warnings()
+        if settings.get("use_udp"):
+            raise ValueError("The writes over UDP are only supported by the influxql backend")
+        self.settings = settings
+        self.chunk_size = chunk_size
+        self.bucket = settings["database"]
+        self.org = settings.get("org", "")
+
+        if settings.get("url") is not None:
+            self.url = settings["url"].rstrip("/")
+        else:
+            self.url = "{}://{}:{}".format(
+                "https" if settings.get("ssl") else "http",
+                settings.get("host", "localhost"),
+                settings.get("port", 8086),
+            )
+
+        token = settings.get("token")
+        if token is None:
+            token = "{}:{}".format(settings.get("username", "root"), settings.get("password", "root"))
+
+        self.session = requests.Session()
+        pool_size = settings.get("pool_size", 10)
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=settings.get("retries", 3),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Authorization"] = "Token " + token
+        self.session.verify = settings.get("verify_ssl", False)
+        if settings.get("cert") is not None:
+            self.session.cert = settings["cert"]
+        if settings.get("proxies"):
+            self.session.proxies.update(settings["proxies"])
+        self.timeout = settings.get("timeout", 60)
+
+    def request(self, method, path, **kwargs):
+        response = self.session.request(
+            method,
+            self.url + path,
+            timeout=self.timeout,
+            **kwargs
+        )
+        if response.status_code >= 400:
+            raise ValueError("InfluxDB answered {} to {}: {}".format(
+                response.status_code, path, response.text
+            ))
+        return response
+
+    def query_batches(self, query):
+        """Execute the flux query and yield `(tags, columns)` for each chunk
+        of at most `chunk_size` rows of a table, where tags are the values of
+        the group key of the table."""
+        logger.info("Executing query:\n%s", query)
+        response = self.request(
+            "POST",
+            "/api/v2/query",
+            params={"org":self.org},
+            data=json.dumps({
+                "query":query,
+                "type":"flux",
+                "dialect":{
+                    "header":True,
+                    "annotations":["datatype", "group", "default"],
+                },
+            }),
+            headers={
+                "Content-Type":"application/json",
+                "Accept":"application/csv",
+            },
+            stream=True,
+        )
+        # Without it, iter_lines yields bytes if the server sends no charset
+        response.encoding = "utf-8"
+        total = 0
+        try:
+            for tags, columns in decode_annotated_csv(
+                response.iter_lines(decode_unicode=True),
+                self.chunk_size,
+            ):
+                total += len(columns["time"])
+                yield tags, columns
+        finally:
+            response.close()
+        logger.info("Got %s points", total)
+
+    def read_series(self, measurement, columns, window=None, time_range=None,
+            tag_filters=None, where="", group_by=None, bucket=None):
+        """Same as `InfluxQLBackend.read_series`, the `where` filter is
+        translated from InfluxQL to Flux by `influxql_filter_to_flux`."""
+        if time_range is None:
+            time_range_clause = "range(start: -{}s)".format(int(window))
+        else:
+            # range is [start, stop) while we want (start, stop]
+            time_range_clause = "range(start: time(v: {}), stop: time(v: {}))".format(
+                *[int(round(t * 1e6)) * 1000 + 1 for t in time_range]
+            )
+
+        lines = [
+            "from(bucket: {})".format(flux_string(self.bucket)),
+            time_range_clause,
+            "filter(fn: (r) => r._measurement == {})".format(flux_string(measurement)),
+            "filter(fn: (r) => {})".format(" or ".join(
+                "r._field == {}".format(flux_string(column))
+                for column, _ in columns
+            )),
+        ]
+        for tag, value in (tag_filters or {}).items():
+            lines.append("filter(fn: (r) => r[{}] == {})".format(flux_string(tag), flux_string(value)))
+        if where:
+            lines.append("filter(fn: (r) => {})".format(influxql_filter_to_flux(where)))
+        if bucket is not None:
+            lines.append("aggregateWindow(every: {}s, fn: mean, createEmpty: false, timeSrc: \"_stop\")".format(bucket))
+
+        group_by = list(group_by or [])
+        lines.extend([
+            "pivot(rowKey: [\"_time\"], columnKey: [\"_field\"], valueColumn: \"_value\")",
+            "group(columns: {})".format(flux_list(group_by)),
+            "keep(columns: {})".format(flux_list(["_time"] + [column for column, _ in columns] + group_by)),
+        ])
+        renames = {
+            column:alias
+            for column, alias in columns
+            if column != alias
+        }
+        if renames:
+            lines.append("rename(columns: {{{}}})".format(", ".join(
+                "{}: {}".format(flux_string(column), flux_string(alias))
+                for column, alias in renames.items()
+            )))
+        lines.append("sort(columns: [\"_time\"])")
+
+        return self.query_batches("\n    |> ".join(lines))
+
+    def tag_combinations(self, measurement, tags, window, where="", field=None):
+        """Return the combinations of the values of the tags, that exist in
+        the last `window` seconds (with a value of `field`, if passed), as a
+        list of dicts"""
+        lines = [
+            "from(bucket: {})".format(flux_string(self.bucket)),
+            "range(start: -{}s)".format(int(window)),
+            "filter(fn: (r) => r._measurement == {})".format(flux_string(measurement)),
+        ]
+        if field:
+            lines.append("filter(fn: (r) => r._field == {})".format(flux_string(field)))
+        if where:
+            lines.append("filter(fn: (r) => {})".format(influxql_filter_to_flux(where)))
+        lines.extend([
+            "group(columns: {})".format(flux_list(tags)),
+            "first()",
+            "keep(columns: {})".format(flux_list(["_time"] + tags)),
+        ])
+        return unique_tag_sets(self.query_batches("\n    |> ".join(lines)), tags)
+
+    def ensure_database(self):
+        """Create the bucket if it does not exist"""
+        buckets = self.request(
+            "GET", "/api/v2/buckets", params={"name":self.bucket, "org":self.org}
+        ).json().get("buckets", [])
+        if len(buckets) != 0:
+            return
+        orgs = self.request("GET", "/api/v2/orgs", params={"org":self.org}).json().get("orgs", [])
+        if len(orgs) == 0:
+            raise ValueError("The organization '{}' does not exist".format(self.org))
+        self.request("POST", "/api/v2/buckets", data=json.dumps({
+            "orgID":orgs[0]["id"],
+            "name":self.bucket,
+            "retentionRules":[],
+        }), headers={"Content-Type":"application/json"})
+
+    def write_points(self, points, time_precision="s", batch_size=None, protocol="json", **kwargs):
+        """Write the points, in the json format of the InfluxDBClient or
+        already as lines of line protocol with `protocol="line"`, as line
+        protocol"""
+        from influxdb.line_protocol import make_lines
+        batch_size = batch_size or len(points) or 1
+        # The precisions of the InfluxDBClient and the ones of the api
+        precision = {"n":"ns", "u":"us"}.get(time_precision, time_precision)
+        for i in range(0, len(points), batch_size):
+            if protocol == "line":
+                data = "\n".join(points[i:i + batch_size])
+            else:
+                data = make_lines({"points":points[i:i + batch_size]}, precision=time_precision)
+            self.request(
+                "POST",
+                "/api/v2/write",
+                params={"org":self.org, "bucket":self.bucket, "precision":precision},
+                data=data.encode(),
+                headers={"Content-Type":"text/plain; charset=utf-8"},
+            )
+        return True
+
+    def close(self):
+        self.session.close()
+
+def flux_string(value):
+    """Quote the value as a flux string literal"""
+    return json.dumps(str(value))
+
+def flux_list(values):
+    return "[{}]".format(", ".join(flux_string(value) for value in values))
+
+# The special columns of the annotated csv, which are not tags
+FLUX_COLUMNS = ["", "result", "table", "_start", "_stop", "_time", "_measurement", "_field", "_value"]
+
+def decode_annotated_csv(lines, chunk_size):
+    """Decode the lines of a flux annotated csv response and yield
+    `(tags, columns)` for each chunk of at most `chunk_size` rows of a table.
+
+    `_time` becomes the `time` column as an integer epoch in seconds, the
+    `double`, `long` and `unsignedLong` columns become float64 np arrays,
+    and the string columns of the group key are returned as the tags."""
+    import numpy as np
+
+    def flush(header, datatypes, group, rows):
+        tags = {
+            name:rows[0][i]
+            for i, name in enumerate(header)
+            if group[i] and name not in FLUX_COLUMNS
+        }
+        columns = {}
+        for i, name in enumerate(header):
+            if name == "_time":
+                values = np.char.rstrip(np.array([row[i] for row in rows]), "Z")
+                columns["time"] = values.astype("datetime64[ns]").astype(np.int64) // 10**9
+            elif name not in FLUX_COLUMNS and datatypes[i] in ["double", "long", "unsignedLong"]:
+                values = np.array([row[i] for row in rows])
+                columns[name] = np.where(values == "", "nan", values).astype(np.float64)
+        return tags, columns
+
+    header, datatypes, group = None, None, None
+    table, rows = None, []
+    for row in csv.reader(lines):
+        # A blank line or new annotations start a new table schema
+        if len(row) == 0 or row[0].startswith("#"):
+            if rows:
+                yield flush(header, datatypes, group, rows)
+                rows = []
+            if len(row) != 0 and row[0] == "#datatype":
+                datatypes = row
+                header = None
+            elif len(row) != 0 and row[0] == "#group":
+                group = [value == "true" for value in row]
+            continue
+
+        if header is None:
+            header = row
+            continue
+
+        # The errors are sent as a table with the error and reference columns
+        if header[1:] == ["error", "reference"]:
+            raise ValueError("The flux query failed: {}".format(row[1]))
+
+        table_index = header.index("table")
+
+        if rows and (row[table_index] != table or len(rows) >= chunk_size):
+            yield flush(header, datatypes, group, rows)
+            rows = []
+        table = row[table_index]
+        rows.append(row)
+
+    if rows:
+        yield flush(header, datatypes, group, rows)
+
+# Matches the tokens of an InfluxQL WHERE clause
+INFLUXQL_TOKEN = re.compile(r"""
+    (?P<string>'(?:[^'\\]|\\.)*')
+    | (?P<regex>/(?:[^/\\]|\\.)*/)
+    | (?P<identifier>"(?:[^"\\]|\\.)*"|[A-Za-z_][A-Za-z0-9_.]*)
+    | (?P<number>-?\d+(?:\.\d*)?)
+    | (?P<operator><>|!=|=~|!~|>=|<=|=|<|>)
+    | (?P<paren>[()])
+    | (?P<space>\s+)
+""", re.VERBOSE)
+
+def influxql_filter_to_flux(where):
+    """Translate a simple InfluxQL filter, like
+    `host = 'host01' AND (disk != 'sda' OR path =~ /^\\/var/)`, to the body of
+    a flux filter function. Only comparisons of tags with strings, numbers
+    and regexes combined with AND, OR and parenthesis are supported."""
+    out = []
+    position = 0
+    while position < len(where):
+        match = INFLUXQL_TOKEN.match(where, position)
+        if match is None:
+            raise ValueError("Cannot translate the filter `{}` to flux at: `{}`".format(where, where[position:]))
+        position = match.end()
+        kind, token = match.lastgroup, match.group()
+        if kind == "space":
+            continue
+        if kind == "string":
+            out.append(flux_string(token[1:-1].replace("\\'", "'")))
+        elif kind == "identifier" and token.upper() in ["AND", "OR"]:
+            out.append(token.lower())
+        elif kind == "identifier":
+            out.append("r[{}]".format(flux_string(token.strip('"'))))
+        elif kind == "operator":
+            out.append({"=":"==", "<>":"!="}.get(token, token))
+        else:
+            out.append(token)
+    return " ".join(out).replace("( ", "(").replace(" )", ")")
@@ -0,0 +1,240 @@
+from time import time
+from operator import itemgetter
+from .logger import logger
+from .udp_writer import UDPWriter
+
+# The settings accepted by the InfluxDBClient
+CLIENT_SETTINGS = [
+    "database",
+    "host",
+    "port",
+    "username",
+    "password",
+    "ssl",
+    "verify_ssl",
+    "timeout",
+    "retries",
+    "proxies",
+    "cert",
+    "pool_size",
+]
+
+class InfluxQLBackend:
+    """The backend for InfluxDB 1.x, it builds InfluxQL queries and runs
+    them with the `influxdb` InfluxDBClient.
+
+    Like every backend, `read_series` yields `(tags, columns)` batches where
+    columns is a dict of np arrays with at least `time` (epoch in seconds)
+    and `value`. All the queries go through `query_batches`.
+    """
+
+    def __init__(self, settings, chunk_size):
+        # The imports are here so that the clis can parse the arguments
+        # without paying for them
+        import urllib3
+        from influxdb import InfluxDBClient
+        urllib3.disable_warnings()
+        self.settings = settings
+        self.chunk_size = chunk_size
+        self.client = InfluxDBClient(**{
+            k:v
+            for k, v in settings.items()
+            if k in CLIENT_SETTINGS
+        })
+        # The writes can be sent over UDP, the queries always use HTTP
+        self.udp = None
+        if settings.get("use_udp"):
+            self.udp = UDPWriter(
+                settings.get("host", "localhost"),
+                settings.get("udp_port", 4444),
+                settings.get("udp_mtu", 1400),
+                settings.get("udp_rate"),
+            )
+
+    def query_batches(self, query, epoch="s"):
+        """Execute the query asking for a chunked response and yield
+        `(tags, columns)` for each chunk, where columns has at most
+        `chunk_size` values of the series identified by tags (None if the
+        query has no GROUP BY).
+        Only one chunk at a time is held in memory, and the rows are
+        decoded directly from the raw response to the columns without
+        building a dict per point. This needs influxdb>=5.3.0, the older
+        clients merge all the chunks in a single ResultSet."""
+        logger.info("Executing query:\n%s", query)
+        total = 0
+        for result in self.client.query(
+            query,
+            epoch=epoch,
+            chunked=True,
+            chunk_size=self.chunk_size,
+        ):
+            for series in result.raw.get("series", []):
+                columns = decode_series(series)
+                if len(columns) == 0:
+                    continue
+                total += len(columns["time"])
+                yield series.get("tags"), columns
+        logger.info("Got %s points", total)
+
+    def read_series(self, measurement, columns, window=None, time_range=None,
+            tag_filters=None, where="", group_by=None, bucket=None):
+        """Read the `(column, alias)` columns of the measurement.
+
+        The points of the last `window` seconds are read or, if `time_range`
+        is passed, the ones with `start < time <= end`. `tag_filters` is a
+        dict of tags that must have the given values and `where` an extra
+        InfluxQL filter. If `bucket` is set the values are averaged in
+        buckets of that many seconds, each stamped with the end of its
+        bucket (but not after the end of the range), like the newest point
+        it averages, so the time left is not measured from up to a bucket
+        before the last point."""
+        if time_range is None:
+            time_filter = "time > (now() - {}s)".format(int(window))
+        else:
+            time_filter = "time > {} AND time <= {}".format(
+                *[int(round(t * 1e6)) * 1000 for t in time_range]
+            )
+
+        tag_filter = "".join(
+            "AND {} = '{}' ".format(k, v)
+            for k, v in (tag_filters or {}).items()
+        )
+
+        group_by = list(group_by or [])
+        if bucket is None:
+            select = "time, " + ", ".join(
+                "{} as {}".format(column, alias)
+                for column, alias in columns
+            )
+            fill = ""
+        else:
+            select = ", ".join(
+                "MEAN({}) as {}".format(column, alias)
+                for column, alias in columns
+            )
+            fill = "fill(none)"
+            group_by.insert(0, "time({}s)".format(bucket))
+
+        if group_by:
+            group_by_clause = "GROUP BY " + ", ".join(group_by)
+        else:
+            group_by_clause = ""
+
+        batches = self.query_batches(
+"""
+SELECT {select}
+FROM "{measurement}"
+WHERE (
+    {time_filter}
+    {tag_filter}
+    {extra_filter}
+)
+{group_by_clause} {fill}
+""".format(
+                extra_filter="AND " + where if where else "",
+                **locals()
+            )
+        )
+        if bucket is None:
+            return batches
+        return shift_buckets(batches, bucket, time() if time_range is None else time_range[1])
+
+    def tag_combinations(self, measurement, tags, window, where="", field=None):
+        """Return the combinations of the values of the tags that exist in
+        the last `window` seconds (with a value of `field`, if passed) as a
+        list of dicts.
+        A single query groups by the tags, so only the series that exist are
+        returned and each of them is a single point."""
+        extra_filter = "AND " + where if where else ""
+        return unique_tag_sets(self.query_batches(
+"""
+SELECT LAST({field})
+FROM "{measurement}"
+WHERE (
+    time > (now() - {window}s)
+    {extra_filter}
+)
+GROUP BY {tags}
+""".format(
+                field=field or "*",
+                measurement=measurement,
+                window=int(window),
+                extra_filter=extra_filter,
+                tags=", ".join(tags),
+            )
+        ), tags)
+
+    def ensure_database(self):
+        # The UDP listener writes to the database of its own configuration
+        if self.udp is None:
+            self.client.create_database(self.settings["database"])
+
+    def write_points(self, points, **kwargs):
+        if self.udp is not None:
+            return self.udp.write_points(points, **kwargs)
+        return self.client.write_points(points, **kwargs)
+
+    def close(self):
+        self.client.close()
+        if self.udp is not None:
+            self.udp.close()
+
+def unique_tag_sets(batches, tags):
+    """Return the distinct values of the tags of the `(tags, columns)`
+    batches as a list of dicts, in the order they are found.
+    The series without some of the tags can't be selected, they are
+    skipped with an error, and if all of them are skipped the selectors
+    are not tags at all."""
+    combinations = []
+    seen = set()
+    skipped = 0
+    for group, _ in batches:
+        values = tuple((group or {}).get(tag, "") for tag in tags)
+        if "" in values:
+            skipped += 1
+            continue
+        if values not in seen:
+            seen.add(values)
+            combinations.append(dict(zip(tags, values)))
+
+    if skipped != 0:
+        if len(combinations) == 0:
+            raise ValueError("No series has all the selectors {}, the selectors must be tags".format(tags))
+        logger.error("Skipped %s series which have no value for some of the selectors %s", skipped, tags)
+    return combinations
+
+def shift_buckets(batches, bucket, end):
+    """Move the times of the downsampled batches from the start to the end
+    of their bucket, without going past `end`"""
+    import numpy as np
+    for tags, columns in batches:
+        columns["time"] = np.minimum(columns["time"] + int(bucket), int(end))
+        yield tags, columns
+
+def decode_series(series):
+    """Decode the raw `columns` and `values` of a series of a ResultSet to
+    a dict of np arrays, the time must be an epoch"""
+    import numpy as np
+    values = series.get("values") or []
+    if len(values) == 0:
+        return {}
+    # Transpose the rows to the columns
+    data = {
+        name:list(map(itemgetter(i), values))
+        for i, name in enumerate(series["columns"])
+    }
+    columns = {
+        name:to_array(column)
+        for name, column in data.items()
+        if name != "time"
+    }
+    columns["time"] = np.array(data["time"], dtype=np.int64)
+    return columns
+
+def to_array(values):
+    """Convert a column to a float64 np array, or to a str one if it's a
+    column of strings"""
+    import numpy as np
+    if isinstance(values[0], str):
+        return np.array(values)
+    return np.array(values, dtype=np.float64)
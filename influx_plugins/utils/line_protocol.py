@@ -0,0 +1,51 @@
+from .logger import logger
+
+def columns_to_lines(measurement, tags, columns):
+    """Format the columns of a series as InfluxDB line protocol, one line
+    for each point, without building a dict per point.
+
+    The `time` column must be an integer epoch in the precision of the
+    write and the other columns are the fields, the integer (and boolean)
+    columns are written as integers and the others as floats. The tags are
+    the same for all the points, like in `make_lines` they are sorted and
+    the empty ones are skipped.
+    NaN and infinite floats can't be written, so the points with any of
+    them are skipped."""
+    import numpy as np
+    prefix = escape(measurement, " ,") + "".join(
+        ",{}={}".format(escape(key, " ,="), escape(value, " ,="))
+        for key, value in sorted((tags or {}).items())
+        if value != ""
+    )
+    times = np.asarray(columns["time"], dtype=np.int64)
+    finite = np.ones(len(times), dtype=bool)
+    fields, values = [], []
+    for name, column in columns.items():
+        if name == "time":
+            continue
+        column = np.asarray(column)
+        if column.dtype.kind in "biu":
+            fields.append(format_literal(escape(name, " ,=")) + "={}i")
+            values.append(column.astype(np.int64))
+        else:
+            fields.append(format_literal(escape(name, " ,=")) + "={!r}")
+            values.append(column.astype(np.float64))
+            finite &= np.isfinite(values[-1])
+
+    skipped = len(times) - np.count_nonzero(finite)
+    if skipped != 0:
+        logger.warning("Skipping %s points of %s with NaN or infinite fields", skipped, measurement)
+
+    template = "{} {} {{}}".format(format_literal(prefix), ",".join(fields))
+    return list(map(template.format, *[column[finite].tolist() for column in values + [times]]))
+
+def escape(string, characters):
+    """Escape the backslashes, the newlines and the given characters"""
+    string = str(string).replace("\\", "\\\\").replace("\n", "\\n")
+    for character in characters:
+        string = string.replace(character, "\\" + character)
+    return string
+
+def format_literal(string):
+    """Escape the braces so that `str.format` keeps them as they are"""
+    return string.replace("{", "{{").replace("}", "}}")
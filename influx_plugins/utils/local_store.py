@@ -0,0 +1,36 @@
+import os
+import json
+import hashlib
+import tempfile
+
+def settings_key(settings, keys):
+    """Return a stable hash of the values of `keys` in `settings`, this is
+    used to identify the files that belong to a given check."""
+    return hashlib.sha1(
+        json.dumps([settings.get(key) for key in keys]).encode()
+    ).hexdigest()
+
+def atomic_write(path, data):
+    """Write `data` (bytes) to `path` so that concurrent readers either see
+    the old file or the new one, never a partially written one."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def read_json(path):
+    """Read a json file, returns None if it does not exist or it's not valid"""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_json(path, data):
+    atomic_write(path, json.dumps(data).encode())
@@ -0,0 +1,87 @@
+import io
+import os
+import json
+import hashlib
+from .logger import logger
+from .local_store import atomic_write
+
+class RecordingMixin:
+    """Saves the result of each query, as it's streamed, in `record_dir`.
+
+    Each query is saved in its own `{sha1 of the query}.npz` file, with one
+    array for each column of each batch and the tags in a json array, so
+    the files are compact and can be read back without the db.
+    Queries with relative times (e.g. `now() - 3600s`) are identified by
+    their text, so they match again when replayed later."""
+
+    def query_batches(self, query):
+        batches = []
+        for tags, columns in super().query_batches(query):
+            batches.append((tags, columns))
+            yield tags, columns
+        path = recording_path(self.settings["record_dir"], query)
+        save_batches(path, query, batches)
+        logger.info("Recorded the result of the query in '%s'", path)
+
+class ReplayMixin:
+    """Answers the queries with the results saved by `RecordingMixin` in
+    `replay_dir` and discards the writes, so no db is needed.
+    The queries are built as usual, so a query that changed since it was
+    recorded is reported as missing."""
+
+    def query_batches(self, query):
+        path = recording_path(self.settings["replay_dir"], query)
+        if not os.path.exists(path):
+            raise ValueError("The query was not recorded in '{}':\n{}".format(path, query))
+        logger.info("Replaying the query from '%s'", path)
+        return load_batches(path)
+
+    def ensure_database(self):
+        pass
+
+    def write_points(self, points, **kwargs):
+        logger.info("Replay mode, discarding %s points", len(points))
+        return True
+
+def with_recording(cls, settings):
+    """Return the backend class `cls` extended to record or replay the
+    queries if `record_dir` or `replay_dir` is in the settings"""
+    if settings.get("replay_dir") is not None:
+        return type("Replay" + cls.__name__, (ReplayMixin, cls), {})
+    if settings.get("record_dir") is not None:
+        return type("Recording" + cls.__name__, (RecordingMixin, cls), {})
+    return cls
+
+def recording_path(directory, query):
+    return os.path.join(
+        directory,
+        "{}.npz".format(hashlib.sha1(query.encode()).hexdigest())
+    )
+
+def save_batches(path, query, batches):
+    """Save the `(tags, columns)` batches in a compressed npz file"""
+    import numpy as np
+    arrays = {}
+    meta = []
+    for i, (tags, columns) in enumerate(batches):
+        meta.append({"tags":tags, "columns":list(columns)})
+        for j, values in enumerate(columns.values()):
+            arrays["{}_{}".format(i, j)] = values
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        meta=np.array(json.dumps({"query":query, "batches":meta})),
+        **arrays
+    )
+    atomic_write(path, buffer.getvalue())
+
+def load_batches(path):
+    """Yield the `(tags, columns)` batches saved by `save_batches`"""
+    import numpy as np
+    with np.load(path) as data:
+        meta = json.loads(str(data["meta"]))
+        for i, batch in enumerate(meta["batches"]):
+            yield batch["tags"], {
+                name:data["{}_{}".format(i, j)]
+                for j, name in enumerate(batch["columns"])
+            }
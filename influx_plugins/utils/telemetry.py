@@ -0,0 +1,98 @@
+import threading
+from time import time, perf_counter
+from contextlib import contextmanager
+from .logger import logger
+
+class Telemetry:
+    """Collects how long the stages of a run take, to write them to the db
+    at the end of the run with `write`.
+
+    Each record becomes a point with the `plugin`, `stage` and (if any)
+    `group` tags and the `seconds` field plus the extra fields of the stage,
+    like the number of `points`. Nothing is collected until `enable` is
+    called, so there is no overhead if the telemetry is not used.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.records = []
+        self.last_time = 0
+        self.lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        """Enable (or disable) the telemetry and forget the old records"""
+        with self.lock:
+            self.enabled = enabled
+            self.records = []
+
+    def record(self, stage, seconds, group=None, **fields):
+        if not self.enabled:
+            return
+        with self.lock:
+            # The times are in microseconds and unique so that the points
+            # of the same stage never overwrite each other
+            self.last_time = max(int(time() * 1e6), self.last_time + 1)
+            self.records.append((self.last_time, stage, group, dict(fields, seconds=float(seconds))))
+
+    @contextmanager
+    def measure(self, stage, group=None, **fields):
+        """Record the time spent in the with block, the block can add
+        fields to the returned dict"""
+        start = perf_counter()
+        try:
+            yield fields
+        finally:
+            self.record(stage, perf_counter() - start, group, **fields)
+
+    def measure_batches(self, stage, batches, group=None):
+        """Yield the `(tags, columns)` batches and record the time spent
+        reading them, but not the time the caller spends on each batch,
+        and the number of points read"""
+        if not self.enabled:
+            yield from batches
+            return
+        seconds, points = 0.0, 0
+        batches = iter(batches)
+        while True:
+            start = perf_counter()
+            try:
+                tags, columns = next(batches)
+            except StopIteration:
+                break
+            finally:
+                seconds += perf_counter() - start
+            points += len(columns["time"])
+            yield tags, columns
+        self.record(stage, seconds, group, points=points)
+
+    def write(self, db, measurement, plugin):
+        """Write the records collected so far to the `measurement` of the db
+        and forget them"""
+        with self.lock:
+            records, self.records = self.records, []
+        if len(records) == 0:
+            return
+        points = [
+            {
+                "measurement":measurement,
+                "time":record_time,
+                "tags":dict({"plugin":plugin, "stage":stage}, **({"group":group} if group else {})),
+                "fields":fields,
+            }
+            for record_time, stage, group, fields in records
+        ]
+        try:
+            # The db could be only readable by the user (like the one read
+            # by check_time), so it's never created
+            db.write_points(points, time_precision="u", create_database=False)
+            logger.info("Wrote %s telemetry points to `%s`", len(points), measurement)
+        except Exception as e:
+            # The telemetry must never make the run fail
+            logger.error("Failed to write the telemetry: %s", e)
+
+def format_group(tags):
+    """Format the tags of a group as a single tag value"""
+    return ",".join("{}={}".format(k, v) for k, v in sorted((tags or {}).items()))
+
+# The telemetry of the process
+telemetry = Telemetry()
@@ -5,6 +5,7 @@ import sys
 from time import time
 from datetime import datetime
 import math
+from datetime import timedelta
 
 from .logger import logger
 
@@ -35,6 +36,51 @@ def rfc3339_to_epoch(string):
     dt = datetime.strptime(date, '%Y-%m-%dT%H:%M:%S')
     return dt.timestamp() + float("0." + ns)
 
+def parse_times_to_epoch(times):
+    """Columnar version of `parse_time_to_epoch`, it takes a sequence of
+    times and returns a np array with the epochs.
+
+    Numeric inputs are returned as they are, RFC3339 strings are parsed in bulk
+    and anything else fallbacks to the point-by-point parsing. The result is
+    identical to calling `parse_time_to_epoch` on each value.
+    """
+    import numpy as np
+    times = np.asarray(times)
+    if times.size == 0 or times.dtype.kind in "iuf":
+        return times
+
+    times = times.astype(str)
+    if np.all(np.char.isnumeric(times)):
+        return times.astype(np.int64)
+
+    if np.all(np.char.endswith(times, "Z")):
+        # Split 'YYYY-MM-DDTHH:MM:SS.ffffffZ' in the date and the fraction
+        parts = np.char.partition(np.char.rstrip(times, "Z"), ".")
+        try:
+            naive = parts[:, 0].astype("datetime64[s]").astype(np.int64)
+        except ValueError:
+            naive = None
+        if naive is not None:
+            return (
+                (naive + _local_offsets(naive)).astype(np.float64)
+                + np.char.add("0.", parts[:, 2]).astype(np.float64)
+            )
+
+    return np.array([parse_time_to_epoch(t) for t in times])
+
+def _local_offsets(naive):
+    """Return, for each naive epoch (a local time read as if it was UTC),
+    the offset that `datetime.timestamp` would apply to it.
+    The offset is computed once per quarter of an hour, which is the
+    granularity of every timezone transition."""
+    import numpy as np
+    buckets, inverse = np.unique(naive // 900, return_inverse=True)
+    offsets = np.array([
+        int((datetime(1970, 1, 1) + timedelta(seconds=int(b) * 900)).timestamp()) - int(b) * 900
+        for b in buckets
+    ], dtype=np.int64)
+    return offsets[inverse.reshape(-1)]
+
 def epoch_to_time(epoch):
     if epoch == "inf" or math.isinf(epoch):
         return "inf"
@@ -0,0 +1,97 @@
+import socket
+from time import perf_counter, sleep
+from .logger import logger
+
+# How many nanoseconds are in each time precision of the InfluxDBClient
+PRECISIONS = {
+    "n":1,
+    "u":10**3,
+    "ms":10**6,
+    "s":10**9,
+    "m":60 * 10**9,
+    "h":3600 * 10**9,
+}
+
+# The zeros to append to the timestamps of the lines to make them nanoseconds
+ZEROS = {
+    None:"",
+    "n":"",
+    "u":"000",
+    "ms":"000000",
+    "s":"000000000",
+}
+
+class UDPWriter:
+    """Sends the points to the UDP listener of InfluxDB without waiting for
+    any acknowledgement.
+
+    The points are converted to line protocol and packed in datagrams of at
+    most `mtu` bytes, at most `rate` datagrams per second are sent (no limit
+    if None) so that the listener buffer is not overrun.
+    The UDP listener always reads the times in its configured precision,
+    which by default is nanoseconds, so the times are sent in nanoseconds.
+    """
+
+    def __init__(self, host, port, mtu=1400, rate=None):
+        if mtu <= 0:
+            raise ValueError("The MTU must be positive, got {}".format(mtu))
+        self.address = (host, port)
+        self.mtu = mtu
+        self.rate = rate
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.next_send = perf_counter()
+        self.stats = {"points":0, "packets":0, "bytes":0}
+
+    def write_points(self, points, time_precision=None, protocol="json", **kwargs):
+        """Send the points, in the json format of the InfluxDBClient or as
+        lines of line protocol with `protocol="line"`"""
+        from influxdb.line_protocol import make_lines
+        factor = PRECISIONS[time_precision or "n"]
+        if protocol == "line":
+            # The timestamp is the last element of the line, so it is
+            # converted to nanoseconds by appending the zeros
+            if time_precision not in ZEROS:
+                raise ValueError("The lines can't be sent with the time precision {}".format(time_precision))
+            zeros = ZEROS[time_precision]
+            lines = [
+                (line + zeros + "\n").encode("utf-8")
+                for line in points
+            ]
+        else:
+            lines = make_lines({"points":[
+                dict(point, time=int(point["time"]) * factor)
+                if isinstance(point.get("time"), (int, float)) else point
+                for point in points
+            ]}).encode("utf-8").splitlines(keepends=True)
+
+        packet = b""
+        for line in lines:
+            if len(packet) + len(line) > self.mtu and packet:
+                self.send(packet)
+                packet = b""
+            if len(line) > self.mtu:
+                logger.warning("A point of %s bytes is bigger than the MTU, sending it alone", len(line))
+            packet += line
+        if packet:
+            self.send(packet)
+
+        self.stats["points"] += len(lines)
+        return True
+
+    def send(self, packet):
+        if self.rate is not None:
+            now = perf_counter()
+            if now < self.next_send:
+                sleep(self.next_send - now)
+            self.next_send = max(now, self.next_send) + 1 / self.rate
+        self.socket.sendto(packet, self.address)
+        self.stats["packets"] += 1
+        self.stats["bytes"] += len(packet)
+
+    def close(self):
+        if self.stats["packets"] != 0:
+            logger.info(
+                "Sent %s points in %s UDP datagrams (%s bytes) to %s:%s",
+                self.stats["points"], self.stats["packets"], self.stats["bytes"], *self.address
+            )
+        self.socket.close()
@@ -0,0 +1,69 @@
+import influxdb
+import pytest
+
+from influx_plugins.anomaly_detection.anomaly_detection_main import anomaly_detection
+
+class Result:
+    def __init__(self, raw):
+        self.raw = raw
+
+class AnomalyClient:
+    """Two hosts with a point every minute, the writes fail if `failing`"""
+    failing = False
+    written = []
+
+    def __init__(self, **kwargs):
+        pass
+
+    def query(self, query, chunked=False, chunk_size=0, **kwargs):
+        now = 1631002422
+        values = [[now - 60 * i, float(i % 17)] for i in range(2000)]
+        if "LAST(" in query:
+            values = values[:1]
+        yield Result({"series":[
+            {"name":"m", "tags":{"host":host}, "columns":["time", "value"], "values":values}
+            for host in ["host01", "host02"]
+            # The queries of a group filter its host
+            if "host = '" not in query or "host = '{}'".format(host) in query
+        ]})
+
+    def create_database(self, database):
+        pass
+
+    def write_points(self, points, **kwargs):
+        if AnomalyClient.failing:
+            raise influxdb.exceptions.InfluxDBClientError("database not found")
+        AnomalyClient.written.extend(points)
+
+    def close(self):
+        pass
+
+SETTINGS = {
+    "verbosity":"critical",
+    "input_database":"anomaly_input",
+    "output_database":"anomaly_output",
+    "input_measurement":"m",
+    "output_measurement":"out",
+    "selectors":"host",
+    "filter":"",
+    "field":"value",
+    "window":"1h",
+    "training_timeframe":"4w",
+    "warning":0.95,
+    "anomaly":0.99,
+    "dry_run":False,
+    "write_to_file":False,
+}
+
+def test_anomaly_detection_writes(monkeypatch):
+    monkeypatch.setattr(influxdb, "InfluxDBClient", AnomalyClient)
+    monkeypatch.setattr(AnomalyClient, "written", [])
+    anomaly_detection(dict(SETTINGS))
+    assert len(AnomalyClient.written) == 2 * 2000
+    # The points are written as line protocol
+    assert {line.split(" ")[0] for line in AnomalyClient.written} == {"out,host=host01", "out,host=host02"}
+
+    # The failed writes make the run fail
+    monkeypatch.setattr(AnomalyClient, "failing", True)
+    with pytest.raises(RuntimeError):
+        anomaly_detection(dict(SETTINGS, input_database="anomaly_failing"))
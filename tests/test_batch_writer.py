@@ -0,0 +1,35 @@
+from influx_plugins.utils import BatchWriter
+
+class FlakyDB:
+    """Records the writes and fails the second one"""
+    def __init__(self):
+        self.writes = []
+
+    def write_points(self, points, **kwargs):
+        self.writes.append((points, kwargs))
+        if len(self.writes) == 2:
+            raise ConnectionError("The db went away")
+
+def test_batch_writer():
+    db = FlakyDB()
+    with BatchWriter(db, batch_size=4, queue_size=1) as writer:
+        writer.write([{"time":float(i)} for i in range(6)])
+        writer.write([{"time":float(i)} for i in range(6, 10)])
+
+    assert [len(points) for points, _ in db.writes] == [4, 4, 2]
+    assert all(kwargs["time_precision"] == "s" for _, kwargs in db.writes)
+    assert [point["time"] for points, _ in db.writes for point in points] == list(range(10))
+    assert all(type(point["time"]) is int for points, _ in db.writes for point in points)
+    assert writer.stats["points"] == 6
+    assert writer.stats["failed_points"] == 4
+    assert writer.stats["failed_batches"] == 1
+
+def test_batch_writer_lines():
+    db = FlakyDB()
+    lines = ["m value=1.0 {}".format(i) for i in range(10)]
+    with BatchWriter(db, batch_size=4, protocol="line") as writer:
+        writer.write(lines[:6])
+        writer.write(lines[6:])
+
+    assert [points for points, _ in db.writes] == [lines[:4], lines[4:8], lines[8:]]
+    assert all(kwargs["protocol"] == "line" for _, kwargs in db.writes)
@@ -0,0 +1,78 @@
+import os
+import json
+import stat
+import threading
+
+import influxdb
+
+from influx_plugins.check_time.check_time_cli import check_time_cli
+from influx_plugins.check_time.check_time_client import send_request, default_socket
+from influx_plugins.check_time.check_time_service import UnixCheckTimeServer, CheckTimeHandler
+
+class Result:
+    def __init__(self, raw):
+        self.raw = raw
+
+class FillingClient:
+    """A disk that fills 1% every 100 seconds"""
+    def __init__(self, **kwargs):
+        pass
+
+    def query(self, query, **kwargs):
+        now = 1631002422
+        yield Result({"series":[{
+            "name":"m",
+            "columns":["time", "value"],
+            "values":[[now - 10 * i, 0.5 - i * 1e-3] for i in range(100)],
+        }]})
+
+    def close(self):
+        pass
+
+def test_service_round_trip(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(influxdb, "InfluxDBClient", FillingClient)
+    db_settings = tmp_path / "db_settings.json"
+    db_settings.write_text(json.dumps({"check_time":{"database":"service_test"}}))
+    argv = [
+        "--db-settings={}".format(db_settings),
+        "--db-type=icinga",
+        "--measurement=m",
+        "--target-column=value",
+        "--value-type=usage_quantile",
+        "--window=1000s",
+        "--warning-threshold=10000s",
+        "--critical-threshold=1000s",
+        "--verbosity=info",
+    ]
+
+    try:
+        check_time_cli(argv)
+    except SystemExit as e:
+        exit_code = e.code
+    expected = capsys.readouterr().out
+
+    path = str(tmp_path / "service.sock")
+    server = UnixCheckTimeServer(path, CheckTimeHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        # Only the user of the service can connect
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        response = send_request(path, argv)
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+    assert expected.startswith("WARNING: ")
+    assert response["stdout"] == expected
+    assert response["exit_code"] == exit_code == 1
+    # The logs of the check are sent back too
+    assert "INFO:" in response["stderr"]
+
+def test_default_socket(monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", "/run/user/1000")
+    assert default_socket() == "/run/user/1000/check_time.sock"
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    monkeypatch.setenv("HOME", "/home/icinga")
+    assert default_socket() == "/home/icinga/.influx_plugins/check_time.sock"
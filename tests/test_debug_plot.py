@@ -0,0 +1,22 @@
+import time
+
+from influx_plugins.check_time.debug_plot import render_async
+
+def slow_write(path):
+    time.sleep(1)
+    with open(path, "w") as f:
+        f.write("plot")
+
+def test_render_async_does_not_wait(tmp_path):
+    path = tmp_path / "plot.png"
+    start = time.time()
+    render_async(slow_write, str(path))
+    assert time.time() - start < 0.5
+    assert not path.exists()
+
+    # The detached process still writes the image
+    for _ in range(50):
+        if path.exists():
+            break
+        time.sleep(0.1)
+    assert path.read_text() == "plot"
@@ -0,0 +1,33 @@
+import numpy as np
+
+from influx_plugins.check_time.estimators import ESTIMATORS, r2_score
+from influx_plugins.check_time.predict_time_left import predict_time_left
+
+def create_data(size=5000, outliers=True):
+    """A disk that fills 1% every 1000 seconds, with some cleanups spikes"""
+    rng = np.random.RandomState(42)
+    x = np.arange(size) * 10
+    y = 0.2 + x * 1e-5 + 0.001 * rng.randn(size)
+    if outliers:
+        y[rng.randint(0, size, size=size // 20)] = 0.05
+    return x, y
+
+def test_estimators_contract():
+    x, y = create_data(outliers=False)
+    for name in ESTIMATORS:
+        time_left, score = predict_time_left(x, y, None, name)
+        assert abs(time_left - 30010) / 30010 < 0.05, name
+        assert 0.99 <= score <= 1, name
+
+def test_robust_estimators():
+    x, y = create_data()
+    for name in ["huber", "theil_sen"]:
+        m, q = ESTIMATORS[name](x, y)
+        assert abs(m - 1e-5) / 1e-5 < 0.02, name
+    m, q = ESTIMATORS["ols"](x, y)
+    assert abs(m - 1e-5) / 1e-5 > 0.02
+
+def test_r2_score():
+    x, y = create_data(outliers=False)
+    assert r2_score(x, y, 1e-5, 0.2) > 0.99
+    assert r2_score(x, np.ones_like(x), 0, 1) == 1.0
@@ -0,0 +1,45 @@
+import numpy as np
+
+from influx_plugins.utils.flux_backend import FluxBackend, decode_annotated_csv, influxql_filter_to_flux
+
+RESPONSE = """#datatype,string,long,dateTime:RFC3339,double,double,string
+#group,false,false,false,false,false,true
+#default,_result,,,,,
+,result,table,_time,value,max,host
+,,0,2021-09-07T08:13:42Z,1.5,10,host01
+,,0,2021-09-07T08:13:52.5Z,2.5,,host01
+,,0,2021-09-07T08:14:02Z,3.5,10,host01
+,,1,2021-09-07T08:13:42Z,4.5,20,host02
+
+#datatype,string,long,dateTime:RFC3339,double,string
+#group,false,false,false,false,true
+#default,_result,,,,
+,result,table,_time,value,host
+,,2,2021-09-07T08:13:42Z,5.5,host03
+"""
+
+def test_decode_annotated_csv():
+    batches = list(decode_annotated_csv(RESPONSE.splitlines(), chunk_size=2))
+    assert [tags for tags, _ in batches] == [
+        {"host":"host01"}, {"host":"host01"}, {"host":"host02"}, {"host":"host03"}
+    ]
+    _, columns = batches[0]
+    assert columns["time"].tolist() == [1631002422, 1631002432]
+    assert columns["value"].tolist() == [1.5, 2.5]
+    assert columns["max"][0] == 10 and np.isnan(columns["max"][1])
+    assert "max" not in batches[3][1]
+
+def test_influxql_filter_to_flux():
+    assert influxql_filter_to_flux(
+        "host = 'host01' AND (service <> 'it\\'s' OR \"disk\" =~ /^sd[ab]$/)"
+    ) == (
+        'r["host"] == "host01" and (r["service"] != "it\'s" or r["disk"] =~ /^sd[ab]$/)'
+    )
+
+def test_downsampled_flux_query(monkeypatch):
+    backend = FluxBackend({"database":"test"}, 100)
+    monkeypatch.setattr(backend, "query_batches", lambda query: query)
+    query = backend.read_series("m", [("used", "value"), ("size", "max")], window=3600, bucket=36)
+    # The buckets are stamped with their end, which is truncated to the range
+    assert 'aggregateWindow(every: 36s, fn: mean, createEmpty: false, timeSrc: "_stop")' in query
+    assert 'rename(columns: {"used": "value", "size": "max"})' in query
@@ -0,0 +1,41 @@
+import sys
+from subprocess import run, PIPE
+
+# These must not be imported just to parse the arguments
+HEAVY_MODULES = ["numpy", "pandas", "sklearn", "scipy", "influxdb", "urllib3", "matplotlib"]
+
+def imported_modules(code):
+    """Run the code with `-X importtime` and return the imported modules
+    and the total import time of influx_plugins in microseconds"""
+    result = run(
+        [sys.executable, "-X", "importtime", "-c", code, "--help"], 
+        stdout=PIPE, stderr=PIPE, universal_newlines=True,
+    )
+    assert result.returncode == 0, result.stderr
+    modules = {}
+    for line in result.stderr.split("\n"):
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        modules[module.strip()] = int(cumulative)
+    return modules
+
+def check_import_time(code):
+    modules = imported_modules(code)
+    heavy = [
+        module
+        for module in modules
+        if module.split(".")[0] in HEAVY_MODULES
+    ]
+    assert heavy == [], "The cli imported {} before parsing the arguments ({}us)".format(
+        heavy, modules["influx_plugins"]
+    )
+
+def test_check_time_cli_import_time():
+    check_import_time("from influx_plugins import check_time_cli; check_time_cli()")
+
+def test_anomaly_detection_cli_import_time():
+    check_import_time("from influx_plugins import anomaly_detection_cli; anomaly_detection_cli()")
+
+def test_check_time_client_import_time():
+    check_import_time("from influx_plugins import check_time_client; check_time_client()")
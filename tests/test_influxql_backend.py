@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+from influxdb.resultset import ResultSet
+
+from influx_plugins.utils import DBAdapter
+from influx_plugins.utils.db_adapter import downsampling_bucket, concatenate_columns
+from influx_plugins.utils.influxql_backend import InfluxQLBackend
+
+class Result:
+    def __init__(self, raw):
+        self.raw = raw
+
+class SeriesClient:
+    """Answers every query with one point for each of the given tag sets"""
+    def __init__(self, groups):
+        self.groups = groups
+        self.queries = []
+
+    def query(self, query, **kwargs):
+        self.queries.append(query)
+        yield Result({"series":[
+            {"name":"m", "tags":tags, "columns":["time", "last"], "values":[[0, 1.0]]}
+            for tags in self.groups
+        ]})
+
+    def close(self):
+        pass
+
+def test_tag_combinations():
+    backend = InfluxQLBackend({"database":"test"}, 100)
+    backend.client = SeriesClient([
+        {"host":"host01", "service":"cpu"},
+        {"host":"host02", "service":"disk"},
+        {"host":"host02", "service":""},
+        # The same series split across chunks
+        {"host":"host01", "service":"cpu"},
+    ])
+    combinations = backend.tag_combinations("m", ["host", "service"], 3600, "host != 'host03'", "value")
+
+    # Only the tag sets that exist, the series without the service are skipped
+    assert combinations == [
+        {"host":"host01", "service":"cpu"},
+        {"host":"host02", "service":"disk"},
+    ]
+    query, = backend.client.queries
+    assert "SELECT LAST(value)" in query
+    assert "AND host != 'host03'" in query
+    assert "GROUP BY host, service" in query
+
+    # A field used as selector is never a tag of the series
+    backend.client = SeriesClient([{"host":"host01"}, {"host":"host02"}])
+    with pytest.raises(ValueError):
+        backend.tag_combinations("m", ["host", "value"], 3600)
+
+class RowsClient:
+    """Answers every query with the given rows"""
+    def __init__(self, columns, values):
+        self.columns = columns
+        self.values = values
+        self.queries = []
+
+    def query(self, query, **kwargs):
+        self.queries.append(query)
+        yield Result({"series":[{"name":"m", "columns":self.columns, "values":self.values}]})
+
+    def close(self):
+        pass
+
+def test_downsampling_bucket():
+    assert downsampling_bucket(3600, None) is None
+    assert downsampling_bucket(3600, 0) is None
+    assert downsampling_bucket(3600, 3600) is None
+    assert downsampling_bucket(3600, 100) == 36
+    assert downsampling_bucket(3600, 7) == 515
+
+def test_downsampled_query(monkeypatch):
+    schemas = [
+        ("icinga", {"measurement":"m", "target_column":"used"}, "used"),
+        ("telegraf", {"measurement":"m", "value_column":"used", "kpi_column":"kpi", "target_kpi":"disk"}, "used"),
+    ]
+    for schema, query_settings, column in schemas:
+        for max_column in [None, "size"]:
+            db = DBAdapter({"database":"test"}, schema)
+            # The backend is shared by the pool, so its client is restored
+            # after the test
+            monkeypatch.setattr(db.backend, "client", RowsClient(["time", "value"], [[4536, 0.5], [4572, 0.6]]))
+            (_, columns), = db.get_check_time_data(dict(
+                query_settings,
+                filter="host = 'host01'",
+                window=3600,
+                max_points=100,
+                max_column=max_column,
+            ), time_range=(1000, 4600))
+
+            query, = db.backend.client.queries
+            assert "MEAN({}) as value".format(column) in query
+            assert ("MEAN(size) as max" in query) == (max_column is not None)
+            assert "AND host = 'host01'" in query
+            assert ("AND kpi = 'disk'" in query) == (schema == "telegraf")
+            assert "GROUP BY time(36s) fill(none)" in query
+            # The buckets are stamped with their end, up to the end of the range
+            assert columns["time"].tolist() == [4572, 4600]
+
+class ChunkedClient:
+    """Answers like the InfluxDBClient with `chunked=True`, a ResultSet for
+    each chunk of the response"""
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def query(self, query, chunked=False, chunk_size=0, **kwargs):
+        assert chunked and chunk_size == 100
+        return (ResultSet(chunk) for chunk in self.chunks)
+
+    def close(self):
+        pass
+
+def test_chunked_query_batches():
+    # The series of host01 is split across the first two chunks
+    backend = InfluxQLBackend({"database":"test"}, 100)
+    backend.client = ChunkedClient([
+        {"series":[{"name":"m", "tags":{"host":"host01"}, "columns":["time", "value", "max"], "values":[[1, 0.5, 2], [2, None, 2]]}]},
+        {"series":[
+            {"name":"m", "tags":{"host":"host01"}, "columns":["time", "value", "max"], "values":[[3, 1.5, None]]},
+            {"name":"m", "tags":{"host":"host02"}, "columns":["time", "value", "max"], "values":[[1, 7.0, 8]]},
+        ]},
+        {},
+    ])
+    batches = list(backend.query_batches("SELECT time, value, max FROM m GROUP BY host"))
+
+    assert [tags for tags, _ in batches] == [{"host":"host01"}, {"host":"host01"}, {"host":"host02"}]
+    _, columns = batches[0]
+    assert columns["time"].dtype == np.int64
+    assert columns["time"].tolist() == [1, 2]
+    assert columns["value"][0] == 0.5 and np.isnan(columns["value"][1])
+
+    host01 = concatenate_columns(batches[:2])
+    assert host01["time"].tolist() == [1, 2, 3]
+    assert host01["max"][:2].tolist() == [2, 2] and np.isnan(host01["max"][2])
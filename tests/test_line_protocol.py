@@ -0,0 +1,33 @@
+import numpy as np
+from influxdb.line_protocol import make_lines
+
+from influx_plugins.utils import columns_to_lines
+
+def test_columns_to_lines():
+    columns = {
+        "time":np.array([1631002422, 1631002482]),
+        "anomaly":np.array([0, 1]),
+        "value":np.array([0.5, 1e-7]),
+    }
+    tags = {"host":"a b,c=d{}", "service":""}
+    lines = columns_to_lines("out {x}", tags, columns)
+    assert lines == [
+        "out\\ {x},host=a\\ b\\,c\\=d{} anomaly=0i,value=0.5 1631002422",
+        "out\\ {x},host=a\\ b\\,c\\=d{} anomaly=1i,value=1e-07 1631002482",
+    ]
+    # The same lines of the json points
+    assert lines == make_lines({"points":[
+        {"measurement":"out {x}", "tags":tags, "time":time, "fields":{"anomaly":anomaly, "value":value}}
+        for time, anomaly, value in zip(*[columns[name].tolist() for name in ["time", "anomaly", "value"]])
+    ]}, precision="s").splitlines()
+
+def test_columns_to_lines_skips_non_finite():
+    columns = {
+        "time":np.array([1, 2, 3, 4]),
+        "anomaly":np.array([0, 0, 1, 0]),
+        "value":np.array([0.5, np.nan, 1.0, np.inf]),
+    }
+    assert columns_to_lines("out", {"host":"a"}, columns) == [
+        "out,host=a anomaly=0i,value=0.5 1",
+        "out,host=a anomaly=1i,value=1.0 3",
+    ]
@@ -0,0 +1,68 @@
+import os
+import asyncio
+import numpy as np
+
+from influx_plugins.anomaly_detection import model_store
+from influx_plugins.anomaly_detection.model_store import ModelStore, MODEL_KEYS, MODEL_SIZE, stored_models
+from influx_plugins.utils import settings_key
+
+class TrainingDB:
+    """Trains each group with thresholds equal to the number of its host"""
+    def __init__(self):
+        self.trained = []
+
+    def thresholds(self, selector_values):
+        return np.full((7, 24, 2), float(selector_values["host"][-1]))
+
+    async def get_all_training_data(self, selectors_groups, query_settings):
+        self.trained.append(len(selectors_groups))
+        return np.stack([self.thresholds(group) for group in selectors_groups])
+
+    async def get_training_data(self, selector_values, query_settings):
+        self.trained.append(1)
+        return self.thresholds(selector_values)
+
+def run(in_db, groups, settings):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(stored_models(in_db, groups, settings))
+    finally:
+        loop.close()
+
+def test_stored_models(tmp_path):
+    settings = {"model_dir":str(tmp_path), "model_ttl":"1h", "selectors":"host"}
+    in_db = TrainingDB()
+    groups = [{"host":"host1"}, {"host":"host2"}]
+
+    # All the groups are trained at once the first time
+    models = run(in_db, groups, settings)
+    assert in_db.trained == [2]
+    assert models.shape == (2, 7, 24, 2)
+    assert (models[0] == 1).all() and (models[1] == 2).all()
+
+    # Then only the new ones, in the order of the groups
+    models = run(in_db, [{"host":"host3"}, {"host":"host1"}], settings)
+    assert in_db.trained == [2, 1]
+    assert (models[0] == 3).all() and (models[1] == 1).all()
+
+    # And all of them when the ttl expires
+    run(in_db, groups, dict(settings, model_ttl="0s"))
+    assert in_db.trained == [2, 1, 2]
+
+def test_stored_models_expiry(tmp_path, monkeypatch):
+    settings = {"model_dir":str(tmp_path), "model_ttl":"1h", "selectors":"host"}
+    store = ModelStore(str(tmp_path), settings_key(settings, MODEL_KEYS))
+    in_db = TrainingDB()
+    monkeypatch.setattr(model_store, "time", lambda: 1000000)
+    run(in_db, [{"host":"host1"}, {"host":"host2"}], settings)
+
+    # The groups not seen for more than 3 ttls are dropped
+    monkeypatch.setattr(model_store, "time", lambda: 1000000 + 3 * 3600 + 1)
+    models = run(in_db, [{"host":"host3"}], settings)
+    assert (models[0] == 3).all()
+    meta = store.load_meta()
+    assert meta["groups"] == ["host=host3"]
+    assert os.path.getsize(store.path("thresholds")) == MODEL_SIZE
+
+    # The stores of different backends are separated
+    assert settings_key(dict(settings, backend="flux"), MODEL_KEYS) != store.key
@@ -0,0 +1,47 @@
+import numpy as np
+from datetime import datetime, timedelta
+
+from influx_plugins.utils import parse_time_to_epoch, parse_times_to_epoch
+from influx_plugins.check_time.normalize_data import normalize_data
+
+VALUE_TYPES = [
+    "usage", "usage_percentile", "usage_quantile", 
+    "free", "free_percentile", "free_quantile"
+]
+
+def test_parse_times_to_epoch():
+    start = datetime(2021, 3, 27, 23, 0, 0)
+    times = [
+        (start + timedelta(seconds=17 * i, microseconds=1000 * (i % 7))).isoformat() + "Z"
+        for i in range(2000)
+    ]
+    expected = np.array([parse_time_to_epoch(t) for t in times])
+    assert np.array_equal(parse_times_to_epoch(times), expected)
+
+    times = [str(1630000000 + i) for i in range(100)]
+    expected = np.array([parse_time_to_epoch(t) for t in times])
+    assert np.array_equal(parse_times_to_epoch(times), expected)
+
+def test_normalize_data():
+    start = datetime(2021, 9, 3, 9, 54, 38)
+    data = [
+        {
+            "time":(start + timedelta(seconds=10 * i)).isoformat() + ".5Z",
+            "value":i % 17,
+            "max":[None, 20, 40][i % 3],
+        }
+        for i in range(1000)
+    ]
+    for value_type in VALUE_TYPES:
+        time, values = normalize_data(data, value_type, 30)
+        assert time[0] == 0 and time[-1] == 9990
+        for point, value in zip(data, values):
+            max_value = point["max"] or 30
+            assert value == {
+                "usage":            point["value"] / max_value,
+                "usage_percentile": point["value"] / 100,
+                "usage_quantile":   point["value"],
+                "free":             1 - (point["value"] / max_value),
+                "free_percentile":  1 - (point["value"] / 100),
+                "free_quantile":    1 - point["value"],
+            }[value_type]
@@ -0,0 +1,93 @@
+import numpy as np
+
+from influx_plugins.check_time import regression_state
+from influx_plugins.check_time.regression_state import RegressionState, incremental_time_left
+from influx_plugins.check_time.estimators import ESTIMATORS
+
+class SeriesDB:
+    """Answers the range queries of `fetch_points` from a fixed series,
+    whose points are written `delay` seconds after their time"""
+    def __init__(self, x, y, delay=0):
+        self.x, self.y, self.delay = x, y, delay
+        self.now = np.inf
+        self.ranges = []
+
+    def visible(self, start, end):
+        return (self.x > start) & (self.x <= end) & (self.x + self.delay <= self.now)
+
+    def get_check_time_data(self, settings, time_range=None, group_by=None):
+        self.ranges.append(time_range)
+        mask = self.visible(*time_range)
+        yield None, {"time":self.x[mask], "value":self.y[mask]}
+
+def create_series(start, end):
+    rng = np.random.RandomState(42)
+    x = np.arange(start, end, 10)
+    y = 0.2 + (x - start) * 1e-5 + 0.001 * rng.randn(x.size)
+    return x, y
+
+def test_regression_state_matches_ols():
+    x, y = create_series(0, 5000)
+    state = RegressionState("key", 0)
+    state.add(x.astype(np.float64), y)
+    state.remove(x[:100].astype(np.float64), y[:100])
+    state.rebase(1000)
+
+    m, q, _ = state.fit()
+    expected_m, expected_q = ESTIMATORS["ols"](x[100:] - 1000.0, y[100:])
+    assert np.isclose(m, expected_m, rtol=1e-8)
+    assert np.isclose(q, expected_q, rtol=1e-8)
+
+def test_incremental_time_left(tmp_path, monkeypatch):
+    start, window = 1600000000, 3600
+    x, y = create_series(start, start + 6 * window)
+    db = SeriesDB(x, y)
+    settings = {
+        "state_dir":str(tmp_path),
+        "window":window,
+        "value_type":"usage_quantile",
+        "max_value":None,
+    }
+
+    # Runs every 10 minutes, the last one after a gap longer than the window
+    for now in [start + window + 600 * i for i in range(5)] + [start + 5 * window + 5]:
+        monkeypatch.setattr(regression_state, "time", lambda: now)
+        db.ranges.clear()
+        time_left, score = incremental_time_left(db, settings)
+
+        window_start = now - window
+        mask = (x > window_start) & (x <= now)
+        m, q = ESTIMATORS["ols"](x[mask] - float(window_start), y[mask])
+        expected = (1 - q) / m - (x[mask].max() - window_start)
+        assert np.isclose(time_left, expected, rtol=1e-6), now
+        assert 0 < score <= 1
+
+        # After the first run only the points that entered or left the
+        # window are read
+        if now != start + window and now != start + 5 * window + 5:
+            assert db.ranges == [(now - 600 - window, window_start), (now - 600 - 300, now)]
+
+def test_incremental_time_left_late_points(tmp_path, monkeypatch):
+    start, window = 1600000000, 3600
+    x, y = create_series(start, start + 4 * window)
+    # Some points are written a few minutes late
+    delay = np.where(np.random.RandomState(0).rand(x.size) < 0.1, 240, 0)
+    db = SeriesDB(x, y, delay)
+    settings = {
+        "state_dir":str(tmp_path),
+        "window":window,
+        "value_type":"usage_quantile",
+        "max_value":None,
+    }
+
+    for now in range(start + window, start + 4 * window, 450):
+        db.now = now
+        monkeypatch.setattr(regression_state, "time", lambda: now)
+        time_left, _ = incremental_time_left(db, settings)
+
+        # The same prediction of reading the whole window
+        window_start = now - window
+        mask = db.visible(window_start, now)
+        m, q = ESTIMATORS["ols"](x[mask] - float(window_start), y[mask])
+        expected = (1 - q) / m - (x[mask].max() - window_start)
+        assert np.isclose(time_left, expected, rtol=1e-6), now
@@ -0,0 +1,29 @@
+import numpy as np
+
+from influx_plugins.utils.replay_backend import with_recording
+
+class StaticBackend:
+    """A backend that answers every query with the same batches"""
+    def __init__(self, settings, chunk_size):
+        self.settings = settings
+        self.queries = []
+
+    def query_batches(self, query):
+        self.queries.append(query)
+        yield {"host":"host01"}, {"time":np.arange(3), "value":np.array([0.5, np.nan, 1.5])}
+        yield None, {"time":np.arange(2), "selector":np.array(["a", "b"])}
+
+def test_record_and_replay(tmp_path):
+    recording = with_recording(StaticBackend, {"record_dir":str(tmp_path)})({"record_dir":str(tmp_path)}, 10)
+    recorded = list(recording.query_batches("SELECT * FROM m"))
+
+    settings = {"replay_dir":str(tmp_path)}
+    replay = with_recording(StaticBackend, settings)(settings, 10)
+    replayed = list(replay.query_batches("SELECT * FROM m"))
+
+    assert replay.queries == []
+    assert [tags for tags, _ in replayed] == [tags for tags, _ in recorded]
+    for (_, expected), (_, columns) in zip(recorded, replayed):
+        assert list(columns) == list(expected)
+        for name in expected:
+            np.testing.assert_array_equal(columns[name], expected[name])
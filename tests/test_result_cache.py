@@ -0,0 +1,54 @@
+import os
+
+from influx_plugins.check_time import result_cache
+from influx_plugins.check_time.result_cache import ResultCache
+
+def check(i):
+    return {"measurement":"m", "filter":"host = 'host{:02}'".format(i), "window":3600}
+
+def test_result_cache(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache, "time", lambda: now[0])
+    cache = ResultCache(str(tmp_path), ttl=60, max_entries=3)
+
+    assert cache.get(check(0)) is None
+    cache.put(check(0), 5000.0, 0.9)
+    cache.put(check(1), float("inf"), 0.0)
+
+    # A hit returns the time left from now, not from when it was cached
+    now[0] = 1030.0
+    assert cache.get(check(0)) == (4970.0, 0.9)
+    assert cache.get(check(1)) == (float("inf"), 0.0)
+    # There are no partially written files left
+    assert sorted(os.listdir(str(tmp_path))) == sorted(
+        os.path.basename(cache.path(check(i))) for i in range(2)
+    )
+
+    # After the ttl the entries expire
+    now[0] = 1061.0
+    assert cache.get(check(0)) is None
+
+    # Only the newest entries are kept, the mtimes are set so that each
+    # entry is older than the next ones
+    for i in range(2, 5):
+        os.utime(cache.path(check(i - 2)), (i, i))
+        cache.put(check(i), 100.0, 1.0)
+    assert sorted(os.listdir(str(tmp_path))) == sorted(
+        os.path.basename(cache.path(check(i))) for i in range(2, 5)
+    )
+
+def test_result_cache_bulk_eviction(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path), ttl=60, max_entries=10)
+    evictions = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, "evict", lambda: evictions.append(evict()))
+
+    for i in range(20):
+        cache.put(check(i), 100.0, 1.0)
+        os.utime(cache.path(check(i)), (i, i))
+    # The directory is scanned only when it goes over the limit, and then
+    # the oldest entries are removed down to 90% of it
+    assert len(evictions) == 5
+    assert sorted(os.listdir(str(tmp_path))) == sorted(
+        os.path.basename(cache.path(check(i))) for i in range(10, 20)
+    )
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from influx_plugins.utils import settings_key
+from influx_plugins.check_time.regression_state import STATE_KEYS
+from influx_plugins.check_time import series_cache
+from influx_plugins.check_time.series_cache import SeriesCache, cached_series
+from influx_plugins.check_time.check_time_main import compute_time_left
+
+class ArrivingDB:
+    """A series whose points are written `delay` seconds after their time,
+    the queries only see the points already written at `now`"""
+    def __init__(self, x, y, delay):
+        self.x, self.y, self.delay = x, y, delay
+        self.now = 0
+
+    def visible(self, start, end):
+        mask = (self.x > start) & (self.x <= end) & (self.x + self.delay <= self.now)
+        return self.x[mask], self.y[mask]
+
+    def get_check_time_data(self, settings, time_range=None, group_by=None):
+        x, y = self.visible(*time_range)
+        yield None, {"time":x, "value":y}
+
+def test_cached_series(tmp_path, monkeypatch):
+    start, window = 1600000000, 3600
+    rng = np.random.RandomState(42)
+    x = np.arange(start, start + 10 * window, 10)
+    y = rng.rand(x.size)
+    # Some points are written a few minutes late
+    delay = np.where(rng.rand(x.size) < 0.1, 240, 0)
+    db = ArrivingDB(x, y, delay)
+    settings = {
+        "series_cache_dir":str(tmp_path),
+        "window":window,
+        "value_type":"usage_quantile",
+        "max_value":None,
+    }
+
+    compacted = False
+    for now in range(start + window, start + 10 * window, 450):
+        db.now = now
+        monkeypatch.setattr(series_cache, "time", lambda: now)
+        cached_x, cached_y = cached_series(db, settings)
+
+        # The same points of reading the whole window
+        expected_x, expected_y = db.visible(now - window, now)
+        np.testing.assert_array_equal(cached_x, expected_x)
+        np.testing.assert_array_equal(cached_y, expected_y)
+
+        # The files never grow much more than the window
+        meta = SeriesCache(str(tmp_path), settings_key(settings, STATE_KEYS)).load_meta()
+        compacted |= meta["start"] == 0 and now > start + 2 * window
+        assert meta["count"] <= 2 * (window // 10) + 1
+    assert compacted
+
+def test_cached_series_no_point(tmp_path):
+    db = ArrivingDB(np.array([], dtype=np.int64), np.array([]), 0)
+    settings = {
+        "series_cache_dir":str(tmp_path),
+        "window":3600,
+        "value_type":"usage_quantile",
+        "max_value":None,
+    }
+    with pytest.raises(ValueError, match="no point"):
+        compute_time_left(db, settings)
@@ -0,0 +1,44 @@
+from time import sleep
+import numpy as np
+
+from influx_plugins.utils.telemetry import Telemetry
+
+class RecorderDB:
+    def __init__(self):
+        self.writes = []
+
+    def write_points(self, points, **kwargs):
+        self.writes.append((points, kwargs))
+
+def slow_batches():
+    for _ in range(3):
+        sleep(0.01)
+        yield None, {"time":np.arange(5)}
+
+def test_telemetry():
+    telemetry = Telemetry()
+    # Disabled, nothing is recorded
+    list(telemetry.measure_batches("query", slow_batches()))
+    assert telemetry.records == []
+
+    telemetry.enable()
+    for _ in telemetry.measure_batches("query", slow_batches(), group="host=host01"):
+        # The time spent by the caller is not counted
+        sleep(0.05)
+    with telemetry.measure("fit", estimator="ols") as fields:
+        fields["points"] = 15
+
+    db = RecorderDB()
+    telemetry.write(db, "telemetry", "check_time")
+    points, kwargs = db.writes[0]
+    assert kwargs["time_precision"] == "u"
+    assert kwargs["create_database"] is False
+    assert [point["tags"] for point in points] == [
+        {"plugin":"check_time", "stage":"query", "group":"host=host01"},
+        {"plugin":"check_time", "stage":"fit"},
+    ]
+    assert points[0]["fields"]["points"] == 15
+    assert 0.03 <= points[0]["fields"]["seconds"] < 0.15
+    assert points[1]["fields"]["estimator"] == "ols"
+    assert points[0]["time"] < points[1]["time"]
+    assert telemetry.records == []
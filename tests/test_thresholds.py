@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from influx_plugins.utils import DBAdapter
+from influx_plugins.utils.db_adapter import compute_thresholds
+from influx_plugins.anomaly_detection.anomaly_detection_main import classify
+
+SETTINGS = {
+    "input_measurement":"m",
+    "field":"value",
+    "selectors":"host,service",
+    "filter":"",
+    "training_timeframe":"4w",
+    "warning":0.95,
+    "anomaly":0.99,
+}
+
+def random_columns(rng, size):
+    return {
+        "time":np.sort(rng.randint(1600000000, 1600000000 + 4 * 7 * 86400, size)),
+        "value":rng.normal(size=size),
+    }
+
+def test_compute_thresholds():
+    columns = random_columns(np.random.RandomState(0), 20000)
+    columns["value"][::13] = np.nan
+    thresholds = compute_thresholds(columns, SETTINGS)
+
+    df = pd.DataFrame({"value":columns["value"]}, index=pd.to_datetime(columns["time"], unit="s"))
+    expected = df.groupby(lambda x: (x.day_name(), x.hour))["value"].quantile([0.95, 0.99])
+    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+    assert thresholds.shape == (7, 24, 2)
+    assert len(expected) == 7 * 24 * 2
+    for ((day, hour), quantile), value in expected.items():
+        assert thresholds[days.index(day), hour, int(quantile == 0.99)] == value
+
+class GroupedBackend:
+    def __init__(self, series):
+        self.series = series
+
+    def read_series(self, measurement, columns, group_by=None, **kwargs):
+        assert group_by == ["host", "service"]
+        for tags, batch in self.series:
+            yield tags, batch
+
+def test_get_all_training_data():
+    rng = np.random.RandomState(1)
+    first, second = random_columns(rng, 3000), random_columns(rng, 5000)
+    db = DBAdapter({"database":"test"}, None)
+    db.backend = GroupedBackend([
+        ({"host":"host01", "service":"cpu"}, first),
+        ({"host":"host02", "service":"cpu"}, {name:values[:2000] for name, values in second.items()}),
+        ({"host":"host02", "service":"cpu"}, {name:values[2000:] for name, values in second.items()}),
+        ({"host":"host03", "service":"cpu"}, first),
+    ])
+    groups = [
+        {"host":"host02", "service":"cpu"},
+        {"host":"host01", "service":"cpu"},
+        {"host":"host04", "service":"cpu"},
+    ]
+    thresholds = db.get_all_training_data(groups, SETTINGS)
+    assert thresholds.shape == (3, 7, 24, 2)
+    np.testing.assert_array_equal(thresholds[0], compute_thresholds(second, SETTINGS))
+    np.testing.assert_array_equal(thresholds[1], compute_thresholds(first, SETTINGS))
+    assert np.isnan(thresholds[2]).all()
+
+def test_classify():
+    thresholds = np.full((7, 24, 2), np.nan)
+    # Thursday the 1st of January 1970 at 00:00 and 01:00 UTC
+    thresholds[3, 0] = [1.0, 2.0]
+    thresholds[3, 1] = [10.0, 20.0]
+    fields = classify({
+        "time":np.array([0, 60, 120, 180, 3600, 7200]),
+        "value":np.array([0.5, 1.5, 2.5, 2.0, 15.0, 100.0]),
+    }, thresholds)
+    # The last point has no thresholds
+    assert fields["time"].tolist() == [0, 60, 120, 180, 3600]
+    assert fields["warning"].tolist() == [0, 1, 0, 0, 1]
+    assert fields["anomaly"].tolist() == [0, 0, 1, 0, 0]
+    assert fields["warn_threshould"].tolist() == [1.0, 1.0, 1.0, 1.0, 10.0]
+    assert fields["anom_threshold"].tolist() == [2.0, 2.0, 2.0, 2.0, 20.0]
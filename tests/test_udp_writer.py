@@ -0,0 +1,46 @@
+import socket
+
+from influx_plugins.utils.udp_writer import UDPWriter
+
+def test_udp_writer():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.settimeout(5)
+
+    writer = UDPWriter("127.0.0.1", listener.getsockname()[1], mtu=200, rate=1000)
+    points = [
+        {
+            "measurement":"measurement",
+            "time":1600000000 + i,
+            "tags":{"host":"host01"},
+            "fields":{"value":float(i), "is_anomaly":False},
+        }
+        for i in range(20)
+    ]
+    writer.write_points(points, time_precision="s")
+
+    lines = []
+    for _ in range(writer.stats["packets"]):
+        packet = listener.recv(65536)
+        assert len(packet) <= 200
+        lines.extend(packet.decode("utf-8").splitlines())
+    writer.close()
+    listener.close()
+
+    assert writer.stats["points"] == 20
+    assert writer.stats["packets"] > 1
+    assert len(lines) == 20
+    assert lines[0].endswith(" 1600000000000000000")
+
+def test_udp_writer_lines():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.settimeout(5)
+
+    writer = UDPWriter("127.0.0.1", listener.getsockname()[1])
+    writer.write_points(["measurement,host=host01 value=1.0 1600000000"], time_precision="s", protocol="line")
+    packet = listener.recv(65536)
+    writer.close()
+    listener.close()
+
+    assert packet == b"measurement,host=host01 value=1.0 1600000000000000000\n"
@@ -1,45 +1,43 @@
 import numpy as np
 from time import time
-from datetime import datetime, timedelta
-
-def create_telegraf_schema_check_time_data(client):
-    """Write test data following the telegraf schema:
-    
-    time       host        service kpi           value
-    ----       ----        ------- ---           -----
-    1567005362 my.host.com service disk_util      0.9
-    1567005362 my.host.com service disk_util_max  2
 
+from influx_plugins.utils import columns_to_lines
+
+# The generators build the columns with numpy and write them as line
+# protocol, so they are cheap enough to be used also by the benchmarks
+# with millions of points. The `*_columns` functions only build the data,
+# the `create_*` functions also write it to the db.
+
+def write_check_time_data(client, tags, columns, to_predict, min_score, settings):
+    """Replace the measurement of the settings with the columns and return
+    what the generators return"""
+    client.drop_measurement(settings["measurement"])
+    client.write_points(
+        columns_to_lines(settings["measurement"], tags, columns),
+        time_precision="s",
+        protocol="line",
+    )
+    return to_predict, min_score, settings
+
+def telegraf_schema_check_time_columns(size=800):
+    """The tags, the columns (from the newest point to the oldest one) and
+    what `create_telegraf_schema_check_time_data` returns"""
+    i = np.arange(size)
+    columns = {
+        "time":int(time()) - i,
+        "value":np.linspace(0, 8 * size / 800, size)[::-1] + ((100 - i) % 100) / 50 - 1,
+        "max":np.full(size, 10),
+    }
+    tags = {
+        "host": "host01",
+        "service": "service01",
+        "kpi": "disk_util"
+    }
 
-    it returns the number of seconds that the check time will have
-    to predict for each kpi and the settings needed to correctly read the data
-    """
-    now = datetime.now()
-    client.drop_measurement("check_time_measurement_telegraf")
-    
-    check_time_test = [
-        {
-            "measurement": "check_time_measurement_telegraf",
-            "tags": {
-                "host": "host01",
-                "service": "service01",
-                "kpi": "disk_util"
-            },
-            "time": (now - timedelta(seconds=i)).isoformat(),
-            "fields": {
-                "value":v + ((100 - i) % 100) / 50 - 1,
-                "max":10,
-            }
-        }
-        for i, v in enumerate(reversed(np.linspace(0, 8, 800)))
-    ]
-
-    client.write_points(check_time_test)
-    
     settings = {
         "db_type":"telegraf",
         "measurement":"check_time_measurement_telegraf",
-        
+
         "filter":"host = 'host01' AND service = 'service01'",
 
         "kpi_column":"kpi",
@@ -57,39 +55,36 @@ def create_telegraf_schema_check_time_data(client):
         "critical_threshold":"400s",
     }
 
-    return 200, 0.9, settings
+    return tags, columns, 200, 0.9, settings
 
-def create_telegraf_schema_check_time_data_no_max(client):
+def create_telegraf_schema_check_time_data(client, size=800):
     """Write test data following the telegraf schema:
-    
-    time       host        service kpi          value
-    ----       ----        ------- ---          -----
-    1567005362 my.host.com service cpu_util     0.9
+
+    time       host        service kpi           value
+    ----       ----        ------- ---           -----
+    1567005362 my.host.com service disk_util      0.9
+    1567005362 my.host.com service disk_util_max  2
 
 
     it returns the number of seconds that the check time will have
-    to predict for each kpi and the settings needed to correctly read the data
+    to predict for each kpi and the settings needed to correctly read the data.
+    `size` is the number of points (one per second) to write.
     """
-    now = datetime.now()
-    client.drop_measurement("check_time_measurement_telegraf")
-    
-    check_time_test = [
-        {
-            "measurement": "check_time_measurement_telegraf",
-            "tags": {
-                "host": "host01",
-                "service": "service01",
-                "kpi": "cpu_util"
-            },
-            "time": (now - timedelta(seconds=i)).isoformat(),
-            "fields": {
-                "value":v,
-            }
-        }
-        for i, v in enumerate(reversed(np.linspace(0, 0.6, 600)))
-    ]
-    client.write_points(check_time_test)
-    
+    return write_check_time_data(client, *telegraf_schema_check_time_columns(size))
+
+def telegraf_schema_check_time_columns_no_max(size=600):
+    """The tags, the columns (from the newest point to the oldest one) and
+    what `create_telegraf_schema_check_time_data_no_max` returns"""
+    columns = {
+        "time":int(time()) - np.arange(size),
+        "value":np.linspace(0, 0.6 * size / 600, size)[::-1],
+    }
+    tags = {
+        "host": "host01",
+        "service": "service01",
+        "kpi": "cpu_util"
+    }
+
     settings = {
         "db_type":"telegraf",
         "measurement":"check_time_measurement_telegraf",
@@ -101,7 +96,7 @@ def create_telegraf_schema_check_time_data_no_max(client):
 
         "value_column":"value",
         "value_type":"usage_quantile",
-        
+
         "verbosity":"info",
         "window":"1000s",
         "debug_plot":"debug/debug_telegraf_no_max.png",
@@ -109,39 +104,35 @@ def create_telegraf_schema_check_time_data_no_max(client):
         "critical_threshold":"600s",
     }
 
-    return 400, 0.98, settings
+    return tags, columns, 400, 0.98, settings
+
+def create_telegraf_schema_check_time_data_no_max(client, size=600):
+    """Write test data following the telegraf schema:
+
+    time       host        service kpi          value
+    ----       ----        ------- ---          -----
+    1567005362 my.host.com service cpu_util     0.9
+
 
-def create_icinga_schema_check_time_data(client):
-    """Write test data using the icinga schema:
-    
-    time       host        service disk_utilization disk_utilization_max
-    ----       ----        ------- ---------------- ---------------
-    1567005362 my.host.com service 0.3              2
-    
     it returns the number of seconds that the check time will have
-    to predict for each kpi and the settings needed to correctly read the data
+    to predict for each kpi and the settings needed to correctly read the data.
+    `size` is the number of points (one per second) to write.
     """
-    now = datetime.now()
-    
-    check_time_test = [
-        {
-            "measurement": "check_time_measurement_icinga",
-            "tags": {
-                "host": "host01",
-                "service": "service01",
-            },
-            "time": (now - timedelta(seconds=i)).isoformat(),
-            "fields": {
-                "disk_utilizzation":v,
-                "disk_utilizzation_max":2,
-            }
-        }
-        for i, v in enumerate(reversed(np.linspace(0, 1.2, 1200) + 0.3 * np.random.random(size=1200)))
-    ]
-    # Drop the previous data
-    client.drop_measurement("check_time_measurement_icinga")
-    client.write_points(check_time_test)
-    
+    return write_check_time_data(client, *telegraf_schema_check_time_columns_no_max(size))
+
+def icinga_schema_check_time_columns(size=1200):
+    """The tags, the columns (from the newest point to the oldest one) and
+    what `create_icinga_schema_check_time_data` returns"""
+    columns = {
+        "time":int(time()) - np.arange(size),
+        "disk_utilizzation":(np.linspace(0, 1.2 * size / 1200, size) + 0.3 * np.random.random(size=size))[::-1],
+        "disk_utilizzation_max":np.full(size, 2),
+    }
+    tags = {
+        "host": "host01",
+        "service": "service01",
+    }
+
     settings = {
         "db_type":"icinga",
         "measurement":"check_time_measurement_icinga",
@@ -156,38 +147,33 @@ def create_icinga_schema_check_time_data(client):
         "critical_threshold":"1000s",
     }
 
-    return 800, 0.9, settings
+    return tags, columns, 800, 0.9, settings
 
-def create_icinga_schema_check_time_data_free(client):
+def create_icinga_schema_check_time_data(client, size=1200):
     """Write test data using the icinga schema:
-    
-    time       host        service space_left_percent
-    ----       ----        ------- ------------------
-    1567005362 my.host.com service 0.3               
-    
+
+    time       host        service disk_utilization disk_utilization_max
+    ----       ----        ------- ---------------- ---------------
+    1567005362 my.host.com service 0.3              2
+
     it returns the number of seconds that the check time will have
-    to predict for each kpi and the settings needed to correctly read the data
+    to predict for each kpi and the settings needed to correctly read the data.
+    `size` is the number of points (one per second) to write.
     """
-    now = datetime.now()
-    
-    check_time_test = [
-        {
-            "measurement": "check_time_measurement_icinga",
-            "tags": {
-                "host": "host01",
-                "service": "service01",
-            },
-            "time": (now - timedelta(seconds=i)).isoformat(),
-            "fields": {
-                "space_left_percent":v,
-            }
-        }
-        for i, v in enumerate(np.linspace(0.4, 0.8, 1200) + 0.1 * np.sin(np.linspace(0, 10 * np.pi, 1200)))
-    ]
-    # Drop the previous data
-    client.drop_measurement("check_time_measurement_icinga")
-    client.write_points(check_time_test)
-    
+    return write_check_time_data(client, *icinga_schema_check_time_columns(size))
+
+def icinga_schema_check_time_columns_free(size=1200):
+    """The tags, the columns (from the newest point to the oldest one) and
+    what `create_icinga_schema_check_time_data_free` returns"""
+    columns = {
+        "time":int(time()) - np.arange(size),
+        "space_left_percent":np.linspace(0.4, 0.4 + 0.4 * size / 1200, size) + 0.1 * np.sin(np.linspace(0, 10 * np.pi * size / 1200, size)),
+    }
+    tags = {
+        "host": "host01",
+        "service": "service01",
+    }
+
     settings = {
         "db_type":"icinga",
         "measurement":"check_time_measurement_icinga",
@@ -201,4 +187,17 @@ def create_icinga_schema_check_time_data_free(client):
         "critical_threshold":"2000s",
     }
 
-    return 1400, 0.65, settings
\ No newline at end of file
+    return tags, columns, 1400, 0.65, settings
+
+def create_icinga_schema_check_time_data_free(client, size=1200):
+    """Write test data using the icinga schema:
+
+    time       host        service space_left_percent
+    ----       ----        ------- ------------------
+    1567005362 my.host.com service 0.3
+
+    it returns the number of seconds that the check time will have
+    to predict for each kpi and the settings needed to correctly read the data.
+    `size` is the number of points (one per second) to write.
+    """
+    return write_check_time_data(client, *icinga_schema_check_time_columns_free(size))